@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Benchmark for the lib2to3 conversion of many small Python files.
+
+Compares creating a new RefactoringTool for every file with the shared tool of ExtractAstPython.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+from lib2to3 import refactor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.extract_ast import convert_2to3  # noqa: E402
+
+SMALL_FILE = """
+import os
+import urlparse
+
+def hello_{0}(name):
+    url = urlparse.urlparse('http://www.uni-goettingen.de/' + name)
+    print "hello %s" % (url,)
+    return os.path.join('a', str({0}))
+"""
+
+
+def new_tool_per_file(corpus):
+    for i, content in enumerate(corpus):
+        rt = refactor.RefactoringTool(set(refactor.get_fixers_from_package('lib2to3.fixes')))
+        str(rt.refactor_string(content, 'file{}.py'.format(i)))
+
+
+def shared_tool(corpus):
+    for i, content in enumerate(corpus):
+        convert_2to3(content, 'file{}.py'.format(i))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the lib2to3 conversion of small files.')
+    parser.add_argument('-n', '--files', help='Number of files in the corpus', type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = [SMALL_FILE.format(i) for i in range(args.files)]
+
+    for name, fn in [('new tool per file', new_tool_per_file), ('shared tool', shared_tool)]:
+        t = timeit.timeit(lambda: fn(corpus), number=1)
+        print('{:<20} {:8.3f}s total {:8.3f}ms per file'.format(name, t, t / args.files * 1000))
+
+
+if __name__ == '__main__':
+    main()
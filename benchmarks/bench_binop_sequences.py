@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""Benchmark for the grouping of binary operation sequences in ComplexityJava.
+
+Uses a generated method with thousands of boolean conditions and compares the sequence key which deep copies the AST path with the current one.
+"""
+
+import argparse
+import copy
+import os
+import sys
+import timeit
+
+import javalang
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.complexity_java import ComplexityJava, JAVA_SEQUENCE_TYPES  # noqa: E402
+
+CONDITION = """
+        if (a > {0} && b || !(c && d) || a == {0}) {{
+            x++;
+        }}
+        while (x < {0} && (a || b && c)) {{
+            x--;
+        }}
+"""
+
+
+class DeepcopyComplexityJava(ComplexityJava):
+    """The previous sequence key which copied the whole path for every binary operation."""
+
+    def _sequence_key(self, path):
+        basepath = copy.deepcopy(path)
+
+        while type(basepath[-1]).__name__ in ['BinaryOperation', 'list']:
+            basepath = basepath[:-1]
+            if type(basepath[-1]).__name__ == 'BinaryOperation' and basepath[-1].operator not in JAVA_SEQUENCE_TYPES:
+                basepath = basepath[:-1]
+                continue
+
+        return basepath[-1].position[0]
+
+
+def generated_method(conditions):
+    source = 'public class Conditions {{\n    public void method(boolean a, boolean b, boolean c, boolean d) {{\n        int x = 0;{}    }}\n}}\n'
+    source = source.format(''.join(CONDITION.format(i) for i in range(conditions // 2)))
+    return [m for _, m in javalang.parse.parse(source).filter(javalang.tree.MethodDeclaration)][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the binary operation sequences of ComplexityJava.')
+    parser.add_argument('-n', '--conditions', help='Number of generated if and while statements', type=int, default=2000)
+    parser.add_argument('-b', '--baseline_conditions', help='Number of conditions for the deepcopy variant, it grows quadratically', type=int, default=100)
+    args = parser.parse_args()
+
+    for name, cls, conditions in [('deepcopy path', DeepcopyComplexityJava, args.baseline_conditions), ('index into path', ComplexityJava, args.baseline_conditions), ('index into path', ComplexityJava, args.conditions)]:
+        method = generated_method(conditions)
+        c = cls(None)
+        t = timeit.timeit(lambda: c._method_metrics(method), number=1)
+        print('{:<20} {:6d} conditions {:8.3f}s total {:8.3f}ms per condition'.format(name, conditions, t, t / conditions * 1000))
+
+
+if __name__ == '__main__':
+    main()
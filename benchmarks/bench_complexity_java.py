@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""Benchmark for the method metrics of ComplexityJava on a large generated class.
+
+Compares separate walks over each method for nesting, cyclomatic complexity, recursion and binop sequences with the single traversal of ComplexityJava.
+The generated methods do not contain sequences of binary operations so that both variants do the same work.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import javalang
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.complexity_java import ComplexityJava, JAVA_BRANCH_TYPES, JAVA_BRANCH_TYPES_MCCC, JAVA_NESTING_TYPES  # noqa: E402
+
+METHOD = """
+    public int method{0}(int a, String[] b) {{
+        int x = 0;
+        for (int i = 0; i < a; i++) {{
+            if (x > i) {{
+                while (x < 10) {{
+                    try {{
+                        x += a > 5 ? method{0}(x - 1, b) : i;
+                    }} catch (Exception e) {{
+                        switch (x) {{
+                            case 1: x = 2; break;
+                            default: x = b.length;
+                        }}
+                    }}
+                }}
+            }} else {{
+                do {{ x--; }} while (x > 0);
+            }}
+        }}
+        return x;
+    }}
+"""
+
+
+def separate_passes(methods):
+    for method in methods:
+        cogcs = 0
+        for path, n in method:
+            nest = len([p for p in path if type(p).__name__ in JAVA_NESTING_TYPES])
+            if type(n).__name__ in JAVA_BRANCH_TYPES + ['TryStatement']:
+                cogcs += 1 + nest
+
+        cc = 1
+        for path, n in method:
+            if type(n).__name__ in JAVA_BRANCH_TYPES_MCCC:
+                cc += 1
+
+        for path, n in method:
+            if type(n).__name__ == 'MethodInvocation' and n.member == method.name:
+                cogcs += 1
+
+        for path, n in method:
+            if type(n).__name__ == 'BinaryOperation' and n.operator in ['&&', '||']:
+                cogcs += 1
+
+
+def single_pass(methods):
+    c = ComplexityJava(None)
+    for method in methods:
+        c._method_metrics(method)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the method metrics of ComplexityJava.')
+    parser.add_argument('-n', '--methods', help='Number of methods in the generated class', type=int, default=500)
+    args = parser.parse_args()
+
+    source = 'public class Large {{\n{}}}\n'.format(''.join(METHOD.format(i) for i in range(args.methods)))
+    methods = [m for _, m in javalang.parse.parse(source).filter(javalang.tree.MethodDeclaration)]
+
+    for name, fn in [('separate passes', separate_passes), ('single pass', single_pass)]:
+        t = timeit.timeit(lambda: fn(methods), number=1)
+        print('{:<20} {:8.3f}s total {:8.3f}ms per method'.format(name, t, t / args.methods * 1000))
+
+
+if __name__ == '__main__':
+    main()
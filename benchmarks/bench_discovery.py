@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""Benchmark for the discovery of the source files in a monorepo.
+
+The tree contains a few source directories next to a large node_modules directory and many non-source files.
+Compares the previous os.walk with a stat of every source file with the os.scandir walk which prunes node_modules.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.discovery import Discovery  # noqa: E402
+
+
+def create_tree(path, dirs, files):
+    for top in ['src', 'web/node_modules', 'docs']:
+        for i in range(dirs):
+            directory = os.path.join(path, top, 'd{:04d}'.format(i))
+            os.makedirs(directory)
+            for j in range(files):
+                ext = '.py' if top == 'src' and j % 2 == 0 else '.js'
+                with open(os.path.join(directory, 'f{:04d}{}'.format(j, ext)), 'w') as f:
+                    f.write('x = 1\n')
+
+
+def os_walk(path):
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.lower().endswith(('.java', '.py')):
+                continue
+            filepath = os.path.join(root, file)
+            filepath.replace(path, '', 1)
+            os.stat(filepath)
+            count += 1
+    return count
+
+
+def scandir(path):
+    return sum(1 for _ in Discovery().walk(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the discovery of the source files.')
+    parser.add_argument('-d', '--dirs', help='Number of directories per top level directory', type=int, default=200)
+    parser.add_argument('-f', '--files', help='Number of files per directory', type=int, default=50)
+    parser.add_argument('-n', '--number', help='Number of repetitions', type=int, default=5)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp() + '/'
+    try:
+        create_tree(path, args.dirs, args.files)
+        for name, fn in [('os.walk', os_walk), ('scandir', scandir)]:
+            t = timeit.timeit(lambda: fn(path), number=args.number) / args.number
+            print('{:<10} {:8.3f}s {:>8} files'.format(name, t, fn(path)))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
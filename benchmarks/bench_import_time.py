@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""Benchmark for the start up time of the entry points.
+
+Every module is imported in a new interpreter with python -X importtime, the cumulative import times of the slowest modules are
+reported together with the wall clock time of the interpreter. With --output the results are appended as one JSON line
+so that the import cost can be tracked over time.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+
+COASTSHARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK')
+
+MODULES = ['coastshark', 'smartshark_plugin', 'util.parallel', 'util.extract_ast', 'util.write_mongo']
+
+
+def import_times(module):
+    """Import the module in a new interpreter and return the wall clock time and module -> cumulative import time in seconds."""
+    start = timeit.default_timer()
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)], cwd=COASTSHARK_DIR, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    wall = timeit.default_timer() - start
+
+    cumulative = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cum) / 1e6
+    return wall, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the entry points.')
+    parser.add_argument('-m', '--modules', help='Modules to import, relative to the coastSHARK directory', nargs='+', default=MODULES)
+    parser.add_argument('-r', '--repeat', help='Number of interpreters per module, the median is reported', type=int, default=5)
+    parser.add_argument('-t', '--top', help='Number of slowest imports to show per module', type=int, default=5)
+    parser.add_argument('-o', '--output', help='Append the results as JSON line to this file', default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        wall = statistics.median(r[0] for r in runs)
+        imported = statistics.median(r[1][module] for r in runs)
+
+        # the heaviest imports of the last run which are direct or indirect dependencies of the module
+        cumulative = runs[-1][1]
+        slowest = sorted((name for name in cumulative if name != module), key=lambda name: cumulative[name], reverse=True)[:args.top]
+
+        results[module] = {'wall': wall, 'import': imported, 'slowest': {name: cumulative[name] for name in slowest}}
+        print('{:<20} {:8.1f}ms interpreter {:8.1f}ms import'.format(module, wall * 1000, imported * 1000))
+        for name in slowest:
+            print('    {:<40} {:8.1f}ms'.format(name, cumulative[name] * 1000))
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({'date': datetime.datetime.now().isoformat(), 'python': sys.version.split()[0], 'results': results}))
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Benchmark for counting the node types of a Python file.
+
+Compares the previous visitor which compared the type name of every node against a dict of names with the lookup table per node class.
+"""
+
+import argparse
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.extract_ast import NodeTypeCountVisitor, PYTHON_NODE_TYPES  # noqa: E402
+
+FUNCTION = """
+def function_{0}(a, b=None, *args, **kwargs):
+    result = []
+    for i, x in enumerate(args):
+        if x is not None and i % 2 == 0 or b:
+            result.append({{'index': i, 'value': x * {0} + len(kwargs)}})
+        elif isinstance(x, str):
+            result += [c.upper() for c in x if c not in 'aeiou']
+    try:
+        return sorted(result, key=lambda r: r['value'])[-1]
+    except IndexError:
+        return None
+"""
+
+
+class NameCountVisitor(ast.NodeVisitor):
+    """The previous visitor with a dict of all type names per file."""
+
+    def __init__(self):
+        self.type_counts = {k: 0 for k in PYTHON_NODE_TYPES}
+        self.node_count = 0
+        super().__init__()
+
+    def generic_visit(self, node):
+        type_name = type(node).__name__
+        self.node_count += 1
+        if type_name in self.type_counts.keys():
+            self.type_counts[type_name] += 1
+        super().generic_visit(node)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark counting the node types of a Python file.')
+    parser.add_argument('-n', '--functions', help='Number of functions in the generated file', type=int, default=500)
+    parser.add_argument('-r', '--repeat', help='Number of times the file is counted', type=int, default=10)
+    args = parser.parse_args()
+
+    tree = ast.parse(''.join(FUNCTION.format(i) for i in range(args.functions)))
+
+    results = []
+    for name, cls in [('type names', NameCountVisitor), ('type index', NodeTypeCountVisitor)]:
+        def count():
+            v = cls()
+            v.visit(tree)
+            results.append((v.node_count, v.type_counts))
+        t = timeit.timeit(count, number=args.repeat)
+        print('{:<20} {:8.3f}s total {:8.3f}ms per file'.format(name, t, t / args.repeat * 1000))
+
+    assert results[0] == results[-1]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Benchmark for the order in which the files are handed to the worker processes.
+
+The corpus contains many small files and a few large files which come last in the order of the file walk.
+Compares the previous multiprocessing.Pool.imap in the order of the files with the WorkerPool which starts the largest files first.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'coastSHARK'))
+
+from util.parallel import find_source_files, extract_file, extract_files, init_worker  # noqa: E402
+
+FUNCTION = """
+def function_{0}(a, b=None):
+    result = [x * {0} for x in range(a) if x % 2 == 0 or b]
+    return sorted(result)[-1] if result else None
+"""
+
+
+def create_corpus(path, small, large, large_functions):
+    for i in range(small):
+        with open(os.path.join(path, 'a_{:05d}.py'.format(i)), 'w') as f:
+            f.write(''.join(FUNCTION.format(j) for j in range(20)))
+    for i in range(large):
+        with open(os.path.join(path, 'z_{:05d}.py'.format(i)), 'w') as f:
+            f.write(''.join(FUNCTION.format(j) for j in range(large_functions)))
+
+
+def file_order(path, workers):
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        for _ in pool.imap(extract_file, find_source_files(path)):
+            pass
+
+
+def largest_first(path, workers):
+    for _ in extract_files(find_source_files(path), workers):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the order of the files for the worker processes.')
+    parser.add_argument('-w', '--workers', help='Number of worker processes', type=int, default=4)
+    parser.add_argument('-s', '--small', help='Number of small files', type=int, default=400)
+    parser.add_argument('-l', '--large', help='Number of large files at the end of the file walk', type=int, default=4)
+    parser.add_argument('-f', '--functions', help='Number of functions in a large file', type=int, default=6000)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp() + '/'
+    try:
+        create_corpus(path, args.small, args.large, args.functions)
+        for name, fn in [('file order', file_order), ('largest first', largest_first)]:
+            t = timeit.timeit(lambda: fn(path, args.workers), number=1)
+            print('{:<15} {:8.3f}s'.format(name, t))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
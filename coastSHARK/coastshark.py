@@ -8,9 +8,12 @@ import sys
 import logging
 import timeit
 
-from util import error
-from util.extract_ast import ExtractAstPython, ExtractAstJava
-from util.write_csv import CsvFile
+from util.parallel import find_source_files, extract_files
+from util.write_csv import open_output_file, FORMATS
+from util.extract_ast import NODE_TYPES
+from util.timing import timings
+from util.skip_log import SkipLog
+from util.discovery import create_discovery, PRUNE_DIRS, VCS_DIRS
 
 # set up logging, we log everything to stdout except for errors which go to stderr
 log = logging.getLogger()
@@ -26,62 +29,62 @@ log.addHandler(e)
 
 
 def main(args):
-    # unused for now
-    ignore_files = []
-    ignore_dirs = []
-
     # preflight checks
     if not os.path.isdir(args.input):
         raise Exception('--input {} is not valid'.format(args.input))
     if not os.access(args.input, os.R_OK):
         raise Exception('--input {} is not readable'.format(args.input))
-    if not args.input.endswith('/'):
-        raise Exception('--input needs trailing slash')
 
     # timing
     start = timeit.default_timer()
+    max_rss = args.max_rss * 1024 * 1024 if args.max_rss else None
+    discovery = create_discovery(args.ignore, args.ignore_file, args.prune_dirs)
 
     log.info("Starting AST extraction")
 
-    m = CsvFile()
+    # the count vectors are only collected if we aggregate them later
+    aggregator = None
+    if args.aggregate or args.matrix:
+        from util.aggregate import Aggregator  # numpy is only imported if it is needed
+        aggregator = Aggregator()
+
+    m = open_output_file(args.output, args.format)
 
-    for root, _, files in os.walk(args.input):
+    try:
+        for record in extract_files(find_source_files(args.input, discovery), args.workers, args.method_metrics, args.cache_dir, args.timeout,
+                                    args.max_file_size, args.max_nodes, max_rss, SkipLog(args.skip_log)):
+            if record['skipped']:
+                log.info(record['skipped'])
+                continue
 
-        if root.replace(args.input, '') in ignore_dirs:  # subtract base_dir then match against ignore_list
-            continue
+            m.write_line(record['path'], record['imports'], record['node_count'], record['type_counts'])
 
-        for file in files:
+            if aggregator is not None:
+                aggregator.add(record)
 
-            if file in ignore_files:
-                continue
+            if record['method_metrics'] is not None:
+                m.write_method_metrics(record['path'], record['method_metrics'])
+
+    # this is critical
+    except Exception as err:
+        log.exception(err)
+        raise
+
+    finally:
+        m.close()
+
+    if args.aggregate:
+        from util.aggregate import GROUPINGS
+        aggregator.write_rollups(args.aggregate)
+        log.info('aggregated {} files by {} into {}'.format(len(aggregator.paths), ', '.join(GROUPINGS), args.aggregate))
+
+    if args.matrix:
+        aggregator.save_matrix(args.matrix)
+        log.info('saved {} x {} node type matrix to {}'.format(len(aggregator.paths), len(NODE_TYPES), args.matrix))
 
-            filepath = os.path.join(root, file)
-            mongo_filepath = filepath.replace(args.input, '')  # use relative path to find File Document in mongodb
-
-            try:
-                if file.endswith('.py'):
-                    log.debug('parsing: %s', mongo_filepath)
-                    eap = ExtractAstPython(filepath)
-                    eap.load()
-                    m.write_line(mongo_filepath, eap.imports, eap.node_count, eap.type_counts)
-
-                if file.endswith('.java'):
-                    log.debug('parsing: %s', mongo_filepath)
-                    eaj = ExtractAstJava(filepath)
-                    eaj.load()
-                    m.write_line(mongo_filepath, eaj.imports, eaj.node_count, eaj.type_counts)
-
-                    if args.method_metrics:
-                        m.write_method_metrics(mongo_filepath, eaj.method_metrics())
-
-            # this is not critical, we can still do the other files
-            except error.ParserException as err:
-                log.info(str(err))
-            # this is critical
-            except Exception as err:
-                log.error('File: %s', filepath)
-                log.exception(err)
-                raise
+    timings.log_summary()
+    if args.timing_report:
+        timings.write_report(args.timing_report)
 
     end = timeit.default_timer() - start
     log.info("Finished AST extraction in {:.5f}s".format(end))
@@ -90,5 +93,20 @@ def main(args):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Analyze the given Path.')
     parser.add_argument('-i', '--input', help='Path to the checked out repository directory', required=True)
+    parser.add_argument('-o', '--output', help='Output file, default ast.csv or the default for the format, method metrics are written next to it, e.g., ast.methods.csv', default=None)
+    parser.add_argument('-f', '--format', help='Output format, default csv', choices=FORMATS, default='csv')
     parser.add_argument('-mm', '--method_metrics', help='Collect new method metrics (experimental)', default=False)
+    parser.add_argument('-w', '--workers', help='Number of worker processes for parsing, default 1', type=int, default=1)
+    parser.add_argument('-cd', '--cache_dir', help='Directory for the persistent result cache, files with a known blob hash are not parsed again', default=None)
+    parser.add_argument('-to', '--timeout', help='Seconds a worker may spend on one file before it is killed and the file is skipped, default no timeout', type=float, default=None)
+    parser.add_argument('-mfs', '--max_file_size', help='Skip larger files (in bytes) without reading them, default no limit', type=int, default=None)
+    parser.add_argument('-mn', '--max_nodes', help='Skip files with more AST nodes, default no limit', type=int, default=None)
+    parser.add_argument('-mr', '--max_rss', help='Memory limit of a worker in MB, a worker above it is replaced and the file is skipped, default no limit', type=int, default=None)
+    parser.add_argument('-sl', '--skip_log', help='Append every skipped file with the reason as JSON line to this file', default=None)
+    parser.add_argument('-ig', '--ignore', help='gitignore-style pattern of files and directories to skip, can be given multiple times', action='append', default=None)
+    parser.add_argument('-if', '--ignore_file', help='File with one gitignore-style pattern per line', default=None)
+    parser.add_argument('-pd', '--prune_dirs', help='Comma separated names of directories which are never analyzed, default {} in the working tree and {} in a git revision'.format(','.join(sorted(PRUNE_DIRS)), ','.join(sorted(VCS_DIRS))), default=None)
+    parser.add_argument('-ag', '--aggregate', help='Directory for the node type counts rolled up by directory, package and language (needs numpy)', default=None)
+    parser.add_argument('-mx', '--matrix', help='Save the files x node types count matrix as .npy or .npz (needs numpy)', default=None)
+    parser.add_argument('-tr', '--timing_report', help='Write the durations per phase and per file as JSON to this file', default=None)
     main(parser.parse_args())
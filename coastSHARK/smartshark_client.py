@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""Thin client which sends a job to smartshark_serve.py and prints the progress, the exit code is 1 if the job failed."""
+
+import argparse
+import sys
+
+from util.server import send_job
+
+
+def main(args):
+    if args.stop:
+        job = {'command': 'stop'}
+    else:
+        job = {'input': args.input, 'repository_url': args.repository_url, 'project_name': args.project_name, 'git_revision': args.git_revision}
+        if args.revisions_file:
+            with open(args.revisions_file, 'r') as f:
+                job['revisions'] = [line.strip() for line in f if line.strip()]
+        elif args.revision_range:
+            job['revision_range'] = args.revision_range
+        else:
+            job['revision'] = args.revision
+
+    for message in send_job(args.socket, job):
+        if message['event'] == 'error':
+            print('job failed: {}'.format(message['message']), file=sys.stderr)
+            return 1
+        if message['event'] == 'progress':
+            print('revision {}: {} files'.format(message['revision'], message['files']))
+        elif message['event'] == 'done':
+            print('Finished AST extraction of {} revision(s) with {} files in {:.5f}s'.format(message['revisions'], message['files'], message['seconds']))
+        elif message['event'] == 'stopped':
+            print('server stopped after {} job(s)'.format(message['jobs']))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send a job to a running smartshark_serve.py.')
+    parser.add_argument('-s', '--socket', help='Path of the Unix domain socket of the server', required=True)
+    parser.add_argument('-i', '--input', help='Path to the checked out repository directory')
+    parser.add_argument('-pn', '--project_name', help='Name of the project.', required=False)
+    parser.add_argument('-r', '--revision', help='Hash of the revision.', required=False)
+    parser.add_argument('-rf', '--revisions_file', help='File with one revision hash per line (implies --git_revision).', required=False)
+    parser.add_argument('-rr', '--revision_range', help='Range of revisions, e.g., A..B (implies --git_revision).', required=False)
+    parser.add_argument('-u', '--repository_url', help='URL of the project (e.g., GIT Url).')
+    parser.add_argument('-gr', '--git_revision', help='Read the files of the revision from the git objects in --input instead of the checked out working tree', action='store_true', default=False)
+    parser.add_argument('--stop', help='Stop the server after the running job', action='store_true', default=False)
+    sys.exit(main(parser.parse_args()))
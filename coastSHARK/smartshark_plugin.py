@@ -3,15 +3,18 @@
 """Plugin for execution with serverSHARK."""
 
 import argparse
-import os
 import sys
 import logging
 import timeit
 
-from util import error
-from util.extract_ast import ExtractAstPython, ExtractAstJava
+from util.parallel import Extractor
+from util.analyze import check_input, analyze
+from util.git_repository import GitRepository
 from util.write_mongo import MongoDb
-from pycoshark.utils import get_base_argparser
+from util.timing import timings
+from util.skip_log import SkipLog
+from util.discovery import create_discovery, PRUNE_DIRS, VCS_DIRS
+from util.cli import get_base_argparser
 
 # set up logging, we log everything to stdout except for errors which go to stderr
 # this is then picked up by serverSHARK
@@ -27,81 +30,67 @@ log.addHandler(i)
 log.addHandler(e)
 
 
+def read_revisions(args, repository):
+    """Return the list of revisions to analyze, either --revision, the lines of --revisions_file or the commits of --revision_range."""
+    if args.revisions_file:
+        with open(args.revisions_file, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    if args.revision_range:
+        return repository.rev_list(args.revision_range)
+    return [args.revision]
+
+
 def main(args):
     if args.log_level:
         log.setLevel(args.log_level)
 
-    # unused for now
-    ignore_files = []
-    ignore_dirs = []
-
-    input_path = args.input
-
     # preflight checks
-    if not os.path.isdir(args.input):
-        raise Exception('--input {} is not valid'.format(args.input))
-    if not os.access(args.input, os.R_OK):
-        raise Exception('--input {} is not readable'.format(args.input))
-    if not input_path.endswith('/'):
-        input_path += '/'
-        log.info('appending / to input')
-        # raise Exception('--input needs trailing slash')
+    input_path = check_input(args.input)
+    if len([r for r in (args.revision, args.revisions_file, args.revision_range) if r]) != 1:
+        raise Exception('exactly one of --revision, --revisions_file or --revision_range is required')
 
     # timing
     start = timeit.default_timer()
+    max_rss = args.max_rss * 1024 * 1024 if args.max_rss else None
+    discovery = create_discovery(args.ignore, args.ignore_file, args.prune_dirs)
+
+    # multiple revisions are always read from the git objects
+    repository = None
+    if args.git_revision or args.revisions_file or args.revision_range:
+        repository = GitRepository(input_path)
+    revisions = read_revisions(args, repository)
+    if not revisions:
+        raise Exception('no revisions to analyze')
 
     # check mongodb connectivity
-    m = MongoDb(args.db_database, args.db_user, args.db_password, args.db_hostname, args.db_port, args.db_authentication, args.ssl, args.project_name, args.repository_url, args.revision)
+    m = MongoDb(args.db_database, args.db_user, args.db_password, args.db_hostname, args.db_port, args.db_authentication, args.ssl, args.project_name, args.repository_url, revisions[0])
     m.connect()
 
+    extractor = Extractor(args.workers, args.method_metrics, args.cache_dir, args.timeout, args.max_file_size, args.max_nodes, max_rss, SkipLog(args.skip_log))
+
     log.info("Starting AST extraction")
 
-    for root, dirs, files in os.walk(args.input):
-
-        if root.replace(args.input, '') in ignore_dirs:  # subtract base_dir then match against ignore_list
-            continue
-
-        for file in files:
-
-            if file in ignore_files:
-                continue
-
-            filepath = os.path.join(root, file)
-            mongo_filepath = filepath.replace(args.input, '')  # use relative path to find File Document in mongodb
-
-            if file.lower().endswith('.java') or file.lower().endswith('.py'):
-                log.debug('parsing file: {}'.format(mongo_filepath))
-            try:
-                if file.lower().endswith('.py'):
-                    e = ExtractAstPython(filepath)
-                    e.load()
-                    m.write_imports(mongo_filepath, e.imports)
-                    m.write_node_type_counts(mongo_filepath, e.node_count, e.type_counts)
-
-                if file.lower().endswith('.java'):
-                    e = ExtractAstJava(filepath)
-                    e.load()
-                    m.write_imports(mongo_filepath, e.imports)
-                    m.write_node_type_counts(mongo_filepath, e.node_count, e.type_counts)
-                    if args.method_metrics:
-                        m.write_method_metrics(mongo_filepath, e.method_metrics())
-
-            # this is not critical, we can still do the other files
-            except error.ParserException as e:
-                log.info(str(e))
-            # this is not critical, we can still do the other files
-            except TabError as e:
-                log.info(str(e))
-            # this is not ciritcal, we can still do the other files
-            except IndentationError as e:
-                log.info(str(e))
-            # this is critical
-            except Exception as e:
-                log.exception(e)
-                raise
+    try:
+        analyze(m, extractor, input_path, revisions, repository, args.queue_size, discovery=discovery)
+
+    # this is critical
+    except Exception as e:
+        log.exception(e)
+        raise
+
+    # write the remaining buffered updates
+    finally:
+        extractor.close()
+        m.close()
+        if repository is not None:
+            repository.close()
+
+    timings.log_summary()
+    if args.timing_report:
+        timings.write_report(args.timing_report)
 
     end = timeit.default_timer() - start
-    log.info("Finished AST extraction in {:.5f}s".format(end))
+    log.info("Finished AST extraction of {} revision(s) in {:.5f}s".format(len(revisions), end))
 
 
 if __name__ == '__main__':
@@ -109,8 +98,23 @@ if __name__ == '__main__':
     parser = get_base_argparser('Analyze the given URI. An URI should be a checked out GIT Repository.', '2.0.4')
     parser.add_argument('-i', '--input', help='Path to the checked out repository directory', required=True)
     parser.add_argument('-pn', '--project_name', help='Name of the project.', required=False)
-    parser.add_argument('-r', '--revision', help='Hash of the revision.', required=True)
+    parser.add_argument('-r', '--revision', help='Hash of the revision.', required=False)
+    parser.add_argument('-rf', '--revisions_file', help='File with one revision hash per line, all revisions are analyzed in this run (implies --git_revision).', required=False)
+    parser.add_argument('-rr', '--revision_range', help='Range of revisions, e.g., A..B, all revisions are analyzed in this run (implies --git_revision).', required=False)
     parser.add_argument('-u', '--repository_url', help='URL of the project (e.g., GIT Url).', required=True)
     parser.add_argument('-ll', '--log_level', help='Log level for stdout (DEBUG, INFO), default INFO', default='INFO')
     parser.add_argument('-mm', '--method_metrics', help='Collect new method metrics (experimental)', default=False)
+    parser.add_argument('-w', '--workers', help='Number of worker processes for parsing, default 1', type=int, default=1)
+    parser.add_argument('-gr', '--git_revision', help='Read the files of the revision from the git objects in --input instead of the checked out working tree', action='store_true', default=False)
+    parser.add_argument('-qs', '--queue_size', help='Number of extracted files which may wait for the MongoDB writer thread, default 1000', type=int, default=1000)
+    parser.add_argument('-cd', '--cache_dir', help='Directory for the persistent result cache, files with a known blob hash are not parsed again', default=None)
+    parser.add_argument('-to', '--timeout', help='Seconds a worker may spend on one file before it is killed and the file is skipped, default no timeout', type=float, default=None)
+    parser.add_argument('-mfs', '--max_file_size', help='Skip larger files (in bytes) without reading them, default no limit', type=int, default=None)
+    parser.add_argument('-mn', '--max_nodes', help='Skip files with more AST nodes, default no limit', type=int, default=None)
+    parser.add_argument('-mr', '--max_rss', help='Memory limit of a worker in MB, a worker above it is replaced and the file is skipped, default no limit', type=int, default=None)
+    parser.add_argument('-sl', '--skip_log', help='Append every skipped file with the reason as JSON line to this file', default=None)
+    parser.add_argument('-ig', '--ignore', help='gitignore-style pattern of files and directories to skip, can be given multiple times', action='append', default=None)
+    parser.add_argument('-if', '--ignore_file', help='File with one gitignore-style pattern per line', default=None)
+    parser.add_argument('-pd', '--prune_dirs', help='Comma separated names of directories which are never analyzed, default {} in the working tree and {} in a git revision'.format(','.join(sorted(PRUNE_DIRS)), ','.join(sorted(VCS_DIRS))), default=None)
+    parser.add_argument('-tr', '--timing_report', help='Write the durations per phase and per file as JSON to this file', default=None)
     main(parser.parse_args())
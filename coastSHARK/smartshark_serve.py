@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Long running server which analyzes the revisions sent by smartshark_client.py, see util.server."""
+
+import sys
+import signal
+import logging
+import timeit
+
+from util.parallel import Extractor
+from util.server import JobServer
+from util.skip_log import SkipLog
+from util.discovery import create_discovery, PRUNE_DIRS, VCS_DIRS
+from util.cli import get_base_argparser
+
+# set up logging, we log everything to stdout except for errors which go to stderr
+log = logging.getLogger('coastSHARK')
+log.setLevel(logging.INFO)
+i = logging.StreamHandler(sys.stdout)
+e = logging.StreamHandler(sys.stderr)
+
+i.setLevel(logging.DEBUG)
+e.setLevel(logging.ERROR)
+
+log.addHandler(i)
+log.addHandler(e)
+
+
+def main(args):
+    if args.log_level:
+        log.setLevel(args.log_level)
+
+    # the server is closed in the finally of serve_forever
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    start = timeit.default_timer()
+    max_rss = args.max_rss * 1024 * 1024 if args.max_rss else None
+    discovery = create_discovery(args.ignore, args.ignore_file, args.prune_dirs)
+
+    db = {'database': args.db_database, 'user': args.db_user, 'password': args.db_password, 'host': args.db_hostname, 'port': args.db_port,
+          'authentication': args.db_authentication, 'ssl': args.ssl}
+    extractor = Extractor(args.workers, args.method_metrics, args.cache_dir, args.timeout, args.max_file_size, args.max_nodes, max_rss, SkipLog(args.skip_log))
+    server = JobServer(args.socket, extractor, db, args.queue_size, args.progress_interval, discovery, args.timing_report)
+
+    try:
+        server.serve_forever()
+    except Exception as e:
+        log.exception(e)
+        raise
+
+    end = timeit.default_timer() - start
+    log.info("Finished {} job(s) in {:.5f}s".format(server.jobs, end))
+
+
+if __name__ == '__main__':
+    parser = get_base_argparser('Analyze the revisions which are sent as jobs to a Unix domain socket.', '2.0.4')
+    parser.add_argument('-s', '--socket', help='Path of the Unix domain socket', required=True)
+    parser.add_argument('-ll', '--log_level', help='Log level for stdout (DEBUG, INFO), default INFO', default='INFO')
+    parser.add_argument('-mm', '--method_metrics', help='Collect new method metrics (experimental)', default=False)
+    parser.add_argument('-w', '--workers', help='Number of worker processes for parsing, default 1', type=int, default=1)
+    parser.add_argument('-qs', '--queue_size', help='Number of extracted files which may wait for the MongoDB writer thread, default 1000', type=int, default=1000)
+    parser.add_argument('-cd', '--cache_dir', help='Directory for the persistent result cache, files with a known blob hash are not parsed again', default=None)
+    parser.add_argument('-to', '--timeout', help='Seconds a worker may spend on one file before it is killed and the file is skipped, default no timeout', type=float, default=None)
+    parser.add_argument('-mfs', '--max_file_size', help='Skip larger files (in bytes) without reading them, default no limit', type=int, default=None)
+    parser.add_argument('-mn', '--max_nodes', help='Skip files with more AST nodes, default no limit', type=int, default=None)
+    parser.add_argument('-mr', '--max_rss', help='Memory limit of a worker in MB, a worker above it is replaced and the file is skipped, default no limit', type=int, default=None)
+    parser.add_argument('-sl', '--skip_log', help='Append every skipped file with the reason as JSON line to this file', default=None)
+    parser.add_argument('-ig', '--ignore', help='gitignore-style pattern of files and directories to skip, can be given multiple times', action='append', default=None)
+    parser.add_argument('-if', '--ignore_file', help='File with one gitignore-style pattern per line', default=None)
+    parser.add_argument('-pd', '--prune_dirs', help='Comma separated names of directories which are never analyzed, default {} in the working tree and {} in a git revision'.format(','.join(sorted(PRUNE_DIRS)), ','.join(sorted(VCS_DIRS))), default=None)
+    parser.add_argument('-pi', '--progress_interval', help='Send a progress message to the client every N files, default 1000', type=int, default=1000)
+    parser.add_argument('-tr', '--timing_report', help='Write the durations per phase and per file of each job as JSON to this file, the job number is inserted before the extension, e.g., timing.3.json', default=None)
+    main(parser.parse_args())
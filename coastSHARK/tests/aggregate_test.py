@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from coastSHARK.util.extract_ast import NODE_TYPES, new_type_counts
+from coastSHARK.util import aggregate
+
+
+def record(path, package, counts):
+    type_counts = new_type_counts()
+    for nt, c in counts.items():
+        type_counts[NODE_TYPES.index(nt)] = c
+    return {'path': path, 'package': package, 'node_count': sum(counts.values()), 'type_counts': type_counts}
+
+
+@unittest.skipIf(aggregate.np is None, 'numpy is not installed')
+class TestAggregation(unittest.TestCase):
+    """The rollups have to match the sums over the single files."""
+
+    def setUp(self):
+        self.records = [
+            record('a/x.py', None, {'Import': 2, 'Name': 3}),
+            record('a/y.py', None, {'Import': 1, 'Call': 4}),
+            record('src/de/A.java', 'de', {'Import': 5, 'MethodDeclaration': 2}),
+            record('src/de/B.java', 'de', {'ClassDeclaration': 1}),
+            record('src/de/sub/C.java', 'de.sub', {'Import': 1}),
+        ]
+        self.aggregator = aggregate.Aggregator()
+        for r in self.records:
+            self.aggregator.add(r)
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_matrix(self):
+        matrix = self.aggregator.matrix()
+        self.assertEqual(matrix.shape, (5, len(NODE_TYPES)))
+        self.assertEqual(matrix[2, NODE_TYPES.index('Import')], 5)
+        self.assertEqual(matrix.sum(), sum(r['node_count'] for r in self.records))
+
+    def test_rollup(self):
+        groups, files, node_totals, percentiles, totals = self.aggregator.rollup('package')
+        self.assertEqual(groups.tolist(), ['a', 'de', 'de.sub'])
+        self.assertEqual(files.tolist(), [2, 2, 1])
+        self.assertEqual(node_totals.tolist(), [10, 8, 1])
+        self.assertEqual(totals[:, NODE_TYPES.index('Import')].tolist(), [3, 5, 1])
+        self.assertEqual(percentiles[2].tolist(), [1, 1, 1])
+
+        groups, files, node_totals, percentiles, totals = self.aggregator.rollup('language')
+        self.assertEqual(groups.tolist(), ['java', 'python'])
+        self.assertEqual(files.tolist(), [3, 2])
+        self.assertEqual(totals[1, NODE_TYPES.index('Call')], 4)
+
+    def test_write(self):
+        self.aggregator.write_rollups(self.path)
+        for grouping in aggregate.GROUPINGS:
+            self.assertTrue(os.path.exists(os.path.join(self.path, 'ast_by_{}.csv'.format(grouping))))
+
+        self.aggregator.save_matrix(os.path.join(self.path, 'matrix.npz'))
+        data = aggregate.np.load(os.path.join(self.path, 'matrix.npz'))
+        self.assertEqual(data['paths'].tolist(), [r['path'] for r in self.records])
+        self.assertEqual(data['node_types'].tolist(), NODE_TYPES)
+        self.assertTrue((data['counts'] == self.aggregator.matrix()).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
+import os
+import ast
+import sys
 import unittest
 import tempfile
+import subprocess
 
-from coastSHARK.util.extract_ast import ExtractAstPython, ExtractAstJava
-from coastSHARK.util.extract_ast import PYTHON_NODE_TYPES, JAVA_NODE_TYPES
+from lib2to3 import refactor
+
+from coastSHARK.util.extract_ast import ExtractAstPython, ExtractAstJava, NodeTypeCountVisitor, convert_2to3, extractor_for
+from coastSHARK.util.error import LimitException
+from coastSHARK.util.extract_ast import PYTHON_NODE_TYPES, JAVA_NODE_TYPES, NODE_TYPES
 
 
 PYTHON_TEST_FILE_CONTENT = """
@@ -80,6 +87,63 @@ class TestAstExtraction(unittest.TestCase):
         self.assertEqual(eap.imports, imports)
         self.assertEqual(eap.type_counts, type_counts)
 
+    def test_2to3_fallback(self):
+        # only python 2 code is converted with 2to3
+        for content, converted in [(PYTHON_TEST_FILE_CONTENT, False), (PYTHON2_TEST_FILE_CONTENT, True)]:
+            py = tempfile.NamedTemporaryFile(delete=False)
+            py.write(content.encode('utf-8'))
+            py.close()
+
+            eap = ExtractAstPython(py.name)
+            eap.load()
+            self.assertEqual(eap.converted_2to3, converted)
+
+    def test_refactoring_tool_reuse(self):
+        # the shared RefactoringTool has to give the same result as a new one for every file
+        for content in [PYTHON2_TEST_FILE_CONTENT, PYTHON_TEST_FILE_CONTENT, PYTHON2_TEST_FILE_CONTENT]:
+            rt = refactor.RefactoringTool(set(refactor.get_fixers_from_package('lib2to3.fixes')))
+            self.assertEqual(convert_2to3(content + '\n', 'test.py'), str(rt.refactor_string(content + '\n', 'test.py')))
+
+    def test_type_counts_vector(self):
+        # python node types come first, java node types which are not also python node types follow
+        self.assertEqual(NODE_TYPES[:len(PYTHON_NODE_TYPES)], PYTHON_NODE_TYPES)
+        self.assertEqual(set(NODE_TYPES), set(PYTHON_NODE_TYPES + JAVA_NODE_TYPES))
+        self.assertEqual(len(NODE_TYPES), len(set(NODE_TYPES)))
+
+        eap = ExtractAstPython('test.py')
+        eap.load(PYTHON_TEST_FILE_CONTENT)
+
+        self.assertEqual(len(eap.counts), len(NODE_TYPES))
+        self.assertEqual(sum(eap.counts), eap.node_count)
+        self.assertEqual(eap.counts[NODE_TYPES.index('Import')], 2)
+        self.assertEqual(eap.type_counts, {nt: eap.counts[NODE_TYPES.index(nt)] for nt in PYTHON_NODE_TYPES})
+
+    def test_max_nodes(self):
+        with self.assertRaises(LimitException):
+            ExtractAstPython('test.py', max_nodes=10).load(PYTHON_TEST_FILE_CONTENT)
+
+        # the visitor stops at the limit instead of counting the whole tree first
+        visitor = NodeTypeCountVisitor(max_nodes=10)
+        with self.assertRaises(LimitException):
+            visitor.visit(ast.parse(PYTHON_TEST_FILE_CONTENT * 100))
+        self.assertEqual(visitor.node_count, 11)
+
+    def test_extractor_for(self):
+        self.assertIsInstance(extractor_for('a/b.py'), ExtractAstPython)
+        self.assertIsInstance(extractor_for('a/B.JAVA'), ExtractAstJava)
+        self.assertEqual(extractor_for('a/b.py').filename, 'a/b.py')
+
+    def test_lazy_imports(self):
+        # the parsers and the MongoDB packages are not imported before they are needed
+        code = 'import sys, coastSHARK.util.parallel, coastSHARK.util.write_mongo; print(sorted(m for m in ("javalang", "lib2to3.refactor", "mongoengine") if m in sys.modules))'
+        out = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+        self.assertEqual(out.strip(), '[]')
+
+        # the entry points only import them when they connect, not for --help
+        code = 'import sys, smartshark_plugin, smartshark_serve; print(sorted(m for m in ("pycoshark", "mongoengine", "pymongo") if m in sys.modules))'
+        out = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True, cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+        self.assertEqual(out.strip(), '[]')
+
     def test_java(self):
         java = tempfile.NamedTemporaryFile(delete=False)
         java.write(JAVA_TEST_FILE_CONTENT.encode('utf-8'))
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coastSHARK.util.discovery import Discovery, create_discovery
+
+
+FILES = ['setup.py', 'a/A.java', 'a/notes.txt', 'a/b/B.java', 'a/b/gen/G.java', 'a/target/T.java', 'build/x.py', 'docs/conf.py',
+         'node_modules/lib/l.py', 'src/generated_x.py', 'src/main.py', 'src/test_main.py', '.git/hooks/h.py']
+
+
+def walk_paths(path):
+    """Sorted os.walk, which is what the discovery replaces."""
+    paths = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(('.java', '.py')):
+                paths.append(os.path.relpath(os.path.join(root, file), path))
+    return paths
+
+
+class DiscoveryTest(unittest.TestCase):
+    """The walk and the filter for git trees have to find the same files in the same order."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for file in FILES:
+            os.makedirs(os.path.join(self.path, os.path.dirname(file)), exist_ok=True)
+            with open(os.path.join(self.path, file), 'w') as f:
+                f.write('x' * len(file))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def paths(self, discovery):
+        walked = [path for _, path, _ in discovery.walk(self.path)]
+        self.assertEqual(walked, [path for path in walk_paths(self.path) if discovery.included(path, tracked=False)])
+        return walked
+
+    def test_same_order_as_walk(self):
+        discovery = Discovery(prune_dirs=[])
+        self.assertEqual([path for _, path, _ in discovery.walk(self.path)], walk_paths(self.path))
+
+        for filepath, path, size in discovery.walk(self.path):
+            self.assertEqual(filepath, os.path.join(self.path, path))
+            self.assertEqual(size, len(path))
+
+    def test_scandir_without_close(self):
+        scandir = os.scandir
+        expected = walk_paths(self.path)
+
+        # the iterator of python 3.5 is neither a context manager nor has it a close method
+        with mock.patch('os.scandir', lambda path: iter(list(scandir(path)))):
+            self.assertEqual([path for _, path, _ in Discovery(prune_dirs=[]).walk(self.path)], expected)
+
+    def test_prune_dirs(self):
+        self.assertEqual(self.paths(Discovery()), ['setup.py', 'a/A.java', 'a/b/B.java', 'a/b/gen/G.java', 'build/x.py', 'docs/conf.py',
+                                                   'src/generated_x.py', 'src/main.py', 'src/test_main.py'])
+        self.assertEqual(self.paths(create_discovery(prune_dirs='build, docs')), ['setup.py', '.git/hooks/h.py', 'a/A.java', 'a/b/B.java', 'a/b/gen/G.java',
+                                                                                    'a/target/T.java', 'node_modules/lib/l.py', 'src/generated_x.py',
+                                                                                    'src/main.py', 'src/test_main.py'])
+
+    def test_tracked_build_dirs(self):
+        # in a git tree a directory named like build output is source, e.g., a java package, only the vcs metadata is pruned
+        discovery = Discovery()
+        self.assertTrue(discovery.included('src/main/java/org/x/target/Foo.java'))
+        self.assertTrue(discovery.included('lib/vendor/six.py'))
+        self.assertFalse(discovery.included('.git/hooks/h.py'))
+        self.assertFalse(discovery.included('src/main/java/org/x/target/Foo.java', tracked=False))
+
+        # explicitly given directories are pruned in both modes
+        self.assertFalse(Discovery(prune_dirs=['target']).included('src/main/java/org/x/target/Foo.java'))
+
+    def test_patterns(self):
+        patterns = ['# comment', '', 'generated_*', 'test_?ain.py', '/build/', 'a/**/gen', '*.java', '!a/b/*.java']
+        self.assertEqual(self.paths(Discovery(patterns)), ['setup.py', 'a/b/B.java', 'docs/conf.py', 'src/main.py'])
+
+        # anchored patterns only match from the root, directory patterns only match directories
+        self.assertEqual(self.paths(Discovery(['/main.py', 'conf.py/', '**/b/'])), ['setup.py', 'a/A.java', 'build/x.py', 'docs/conf.py',
+                                                                                    'src/generated_x.py', 'src/main.py', 'src/test_main.py'])
+
+    def test_ignore_file(self):
+        ignore_file = os.path.join(self.path, 'ignore.txt')
+        with open(ignore_file, 'w') as f:
+            f.write('src/\n!setup.py\n*.py\n')
+        self.assertEqual(self.paths(create_discovery(['!docs/*'], ignore_file)), ['a/A.java', 'a/b/B.java', 'a/b/gen/G.java'])
+
+
+if __name__ == '__main__':
+    unittest.main()
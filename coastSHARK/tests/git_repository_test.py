@@ -0,0 +1,162 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from coastSHARK.util.git_repository import GitRepository
+from coastSHARK.util.analyze import analyze
+from coastSHARK.util.discovery import Discovery
+from coastSHARK.util.parallel import Extractor, find_source_files, extract_files, extract_revision
+
+
+PYTHON_TEST_FILE_CONTENT = """
+import os
+
+def hello(name):
+    return os.path.join('hello', name)
+"""
+
+
+class FakeMongoDb(object):
+    """Records the revisions and written paths."""
+
+    def __init__(self, revision):
+        self.revision = revision
+        self.revisions = []
+        self.paths = []
+
+    def set_revision(self, revision):
+        self.revision = revision
+        self.revisions.append(revision)
+
+    def write_imports(self, filepath, imports):
+        self.paths.append((self.revision, filepath))
+
+    def write_node_type_counts(self, filepath, node_count, node_type_counts):
+        pass
+
+
+class GitRepositoryTest(unittest.TestCase):
+    """Reading from the git objects needs to give the same results as reading the checked out files."""
+
+    def git(self, *args):
+        return subprocess.check_output(['git', '-C', self.path, '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args)).decode('ascii').strip()
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+        self.git('init', '-q')
+
+        os.makedirs(os.path.join(self.path, 'pkg'))
+        with open(os.path.join(self.path, 'pkg', 'a.py'), 'w') as f:
+            f.write(PYTHON_TEST_FILE_CONTENT)
+        with open(os.path.join(self.path, 'b.py'), 'w') as f:
+            f.write(PYTHON_TEST_FILE_CONTENT * 2)
+        with open(os.path.join(self.path, 'README.md'), 'w') as f:
+            f.write('not parsed')
+
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'first')
+        self.revision = self.git('rev-parse', 'HEAD')
+
+        # the working tree differs from the revision
+        with open(os.path.join(self.path, 'b.py'), 'w') as f:
+            f.write('changed = True\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_ls_tree_read(self):
+        repository = GitRepository(self.path)
+        files = list(repository.ls_tree(self.revision))
+        self.assertEqual([p for _, p in files], ['b.py', 'pkg/a.py'])
+        self.assertEqual(repository.read(files[1][0]), PYTHON_TEST_FILE_CONTENT.encode('ascii'))
+        self.assertEqual(repository.read(files[0][0]), (PYTHON_TEST_FILE_CONTENT * 2).encode('ascii'))
+        repository.close()
+
+    def test_extract(self):
+        repository = GitRepository(self.path)
+        extractor = Extractor()
+        records = list(extract_revision(extractor, repository, self.revision, {}))
+        extractor.close()
+        repository.close()
+
+        self.git('checkout', '-q', '-f', self.revision)
+        expected = list(extract_files(find_source_files(self.path)))
+        self.assertEqual(len(records), len(expected))
+        for r1, r2 in zip(records, expected):
+            self.assertIsNotNone(r1['blob'])  # we know the blob hash from git
+            for k in ('path', 'imports', 'node_count', 'type_counts', 'method_metrics', 'skipped'):
+                self.assertEqual(r1[k], r2[k])
+
+    def test_extract_revisions(self):
+        self.git('commit', '-q', '-a', '-m', 'second')
+        second = self.git('rev-parse', 'HEAD')
+
+        repository = GitRepository(self.path)
+        self.assertEqual(repository.rev_list('{}..{}'.format(self.revision, second)), [second])
+
+        extractor = Extractor()
+        previous = {}
+        first_records = list(extract_revision(extractor, repository, self.revision, previous))
+        second_records = list(extract_revision(extractor, repository, second, previous))
+        extractor.close()
+        repository.close()
+
+        self.assertEqual([r['path'] for r in first_records], ['b.py', 'pkg/a.py'])
+        self.assertEqual([r['path'] for r in second_records], ['b.py', 'pkg/a.py'])
+
+        # only b.py changed, the record of pkg/a.py is re-used
+        self.assertNotEqual(first_records[0]['blob'], second_records[0]['blob'])
+        self.assertEqual(second_records[0]['imports'], [])
+        self.assertIs(first_records[1], second_records[1])
+        self.assertEqual(set(previous.keys()), {'b.py', 'pkg/a.py'})
+        self.assertIs(previous['b.py'], second_records[0])
+
+    def test_analyze(self):
+        self.git('commit', '-q', '-a', '-m', 'second')
+        second = self.git('rev-parse', 'HEAD')
+
+        repository = GitRepository(self.path)
+        extractor = Extractor()
+        m = FakeMongoDb(self.revision)
+        total = analyze(m, extractor, self.path, [self.revision, second], repository)
+        extractor.close()
+        repository.close()
+
+        # the commit of the first revision is already known from connect
+        self.assertEqual(m.revisions, [second])
+        self.assertEqual(total, 4)
+        self.assertEqual(m.paths, [(self.revision, 'b.py'), (self.revision, 'pkg/a.py'), (second, 'b.py'), (second, 'pkg/a.py')])
+
+    def test_ignore(self):
+        repository = GitRepository(self.path)
+        extractor = Extractor()
+        records = list(extract_revision(extractor, repository, self.revision, {}, Discovery(['pkg/'])))
+        pruned = list(extract_revision(extractor, repository, self.revision, {}, Discovery(prune_dirs=['pkg'])))
+        extractor.close()
+        repository.close()
+
+        self.assertEqual([r['path'] for r in records], ['b.py'])
+        self.assertEqual([r['path'] for r in pruned], ['b.py'])
+
+    def test_tracked_target(self):
+        os.makedirs(os.path.join(self.path, 'pkg', 'target'))
+        with open(os.path.join(self.path, 'pkg', 'target', 'c.py'), 'w') as f:
+            f.write(PYTHON_TEST_FILE_CONTENT)
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'target package')
+
+        repository = GitRepository(self.path)
+        extractor = Extractor()
+        records = list(extract_revision(extractor, repository, self.git('rev-parse', 'HEAD'), {}, Discovery()))
+        extractor.close()
+        repository.close()
+
+        # the default build output directories are only pruned in the working tree
+        self.assertEqual([r['path'] for r in records], ['b.py', 'pkg/a.py', 'pkg/target/c.py'])
+        self.assertEqual([f.path for f in find_source_files(self.path)], ['b.py', 'pkg/a.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest import mock
+
+from coastSHARK.util import parallel
+from coastSHARK.util.parallel import find_source_files, extract_files, WorkerPool
+from coastSHARK.util.cache import blob_hash
+from coastSHARK.util.skip_log import SkipLog
+
+
+PYTHON_TEST_FILE_CONTENT = """
+import os
+from datetime import date
+
+def hello(name):
+    return 'Hello {} on {}'.format(name, date.today())
+"""
+
+PYTHON_BROKEN_FILE_CONTENT = """
+def hello(name:
+    return name
+"""
+
+extract_file = parallel.extract_file
+
+
+def hanging_extract_file(job):
+    """Never finishes a/file1.py, this is used in the forked worker processes."""
+    if job.path == 'a/file1.py':
+        time.sleep(60)
+    return extract_file(job)
+
+
+class TestParallelExtraction(unittest.TestCase):
+    """Parallel extraction needs to return the same records in the same order as the sequential extraction."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+        for i, d in enumerate(['b', 'a', 'a/c']):
+            os.makedirs(os.path.join(self.path, d), exist_ok=True)
+            for j in range(3):
+                with open(os.path.join(self.path, d, 'file{}.py'.format(j)), 'w') as f:
+                    f.write(PYTHON_TEST_FILE_CONTENT * (i + j + 1))
+
+        with open(os.path.join(self.path, 'a', 'broken.py'), 'w') as f:
+            f.write(PYTHON_BROKEN_FILE_CONTENT)
+
+        with open(os.path.join(self.path, 'a', 'README.md'), 'w') as f:
+            f.write('not parsed')
+
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.cache_dir)
+
+    def test_find_source_files(self):
+        paths = [f.path for f in find_source_files(self.path)]
+        self.assertEqual(paths, ['a/broken.py', 'a/file0.py', 'a/file1.py', 'a/file2.py', 'a/c/file0.py', 'a/c/file1.py', 'a/c/file2.py', 'b/file0.py', 'b/file1.py', 'b/file2.py'])
+
+    def test_workers(self):
+        sequential = list(extract_files(find_source_files(self.path), workers=1))
+        parallel = list(extract_files(find_source_files(self.path), workers=3))
+
+        # the durations differ from run to run
+        for record in sequential + parallel:
+            if not record['skipped']:
+                self.assertIn('parse', record['timings'])
+            del record['timings']
+
+        self.assertEqual(sequential, parallel)
+        self.assertEqual(len(parallel), 10)
+
+        self.assertIsNotNone(parallel[0]['skipped'])
+        for record in parallel[1:]:
+            self.assertIsNone(record['skipped'])
+            self.assertEqual(set(record['imports']), {'os', 'datetime.date'})
+
+    def test_blob_hash(self):
+        # same as git hash-object
+        self.assertEqual(blob_hash(b''), 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391')
+        self.assertEqual(blob_hash(b'hello world\n'), '3b18e512dba79e4c8300dd08aeb37f8e728b8dad')
+
+    def test_cache(self):
+        first = list(extract_files(find_source_files(self.path), workers=1, cache_dir=self.cache_dir))
+        second = list(extract_files(find_source_files(self.path), workers=2, cache_dir=self.cache_dir))
+
+        # files with the same content as an earlier file of the same run are found in the cache, the cache is closed afterwards
+        self.assertEqual([r['cached'] for r in first], [r['blob'] in [p['blob'] for p in first[:i]] for i, r in enumerate(first)])
+        self.assertEqual([r['path'] for r in first if r['cached']], ['a/c/file0.py', 'a/c/file1.py', 'b/file1.py', 'b/file2.py'])
+        self.assertIsNone(parallel._cache)
+        self.assertEqual([r['cached'] for r in second], [False] + [True] * 9)  # skipped files are not cached
+
+        for r1, r2 in zip(first, second):
+            self.assertEqual(r1['blob'], r2['blob'])
+            for k in ('path', 'imports', 'node_count', 'type_counts', 'method_metrics', 'skipped'):
+                self.assertEqual(r1[k], r2[k])
+
+    def test_limits(self):
+        skip_log = os.path.join(self.cache_dir, 'skipped.jsonl')
+        size = len(PYTHON_TEST_FILE_CONTENT) * 3
+        for workers in [1, 2]:
+            records = list(extract_files(find_source_files(self.path), workers=workers, max_file_size=size, max_nodes=45, skip_log=SkipLog(skip_log)))
+            reasons = {r['path']: r['skip_reason'] for r in records if r['skipped']}
+            self.assertEqual(reasons, {'a/broken.py': 'parse_error', 'a/file1.py': 'too_many_nodes', 'a/file2.py': 'too_large', 'a/c/file0.py': 'too_many_nodes',
+                                       'a/c/file1.py': 'too_large', 'a/c/file2.py': 'too_large', 'b/file2.py': 'too_many_nodes'})
+
+            # every skipped file is written to the skip log
+            with open(skip_log, 'r') as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual({line['path']: line['reason'] for line in lines}, reasons)
+            os.remove(skip_log)
+
+    def test_rss_after_file(self):
+        rss = [2 ** 40]  # only the first check, i.e., after the first file is done, is above the limit
+
+        def process_rss(pid):
+            return rss.pop() if rss else 0
+
+        # the interval is long enough that the workers are only checked after their file is done
+        with mock.patch('coastSHARK.util.parallel.process_rss', process_rss), mock.patch('coastSHARK.util.parallel.RSS_INTERVAL', 60):
+            records = list(extract_files(find_source_files(self.path), workers=1, max_rss=2 ** 30))
+
+        self.assertEqual(rss, [])
+        self.assertEqual([r['path'] for r in records], [f.path for f in find_source_files(self.path)])
+        self.assertEqual([r['path'] for r in records if r['skipped']], ['a/broken.py'])
+
+    def test_largest_first(self):
+        files = list(find_source_files(self.path))
+        pool = WorkerPool(1)
+        order = [index for index, _ in pool.run(files)]
+        pool.close()
+        self.assertEqual([files[i].size for i in order], sorted((f.size for f in files), reverse=True))
+
+    def test_stop_early(self):
+        files = list(find_source_files(self.path))
+        pool = WorkerPool(2)
+        workers = list(pool._workers)
+        records = pool.run(files)
+        next(records)
+        records.close()
+
+        # the busy worker is killed without starting a new process, this is done when the pool is used again
+        self.assertEqual(pool._workers, workers)
+        self.assertEqual(len([w for w in workers if not w.process.is_alive()]), 1)
+        self.assertEqual(len(list(pool.run(files))), len(files))
+        self.assertTrue(all(w.process.is_alive() for w in pool._workers))
+        pool.close()
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'the workers need to inherit the patched extract_file')
+    def test_timeout(self):
+        with mock.patch('coastSHARK.util.parallel.extract_file', hanging_extract_file), mock.patch('coastSHARK.util.parallel.START_METHOD', 'fork'):
+            start = time.time()
+            records = list(extract_files(find_source_files(self.path), workers=2, timeout=1))
+            self.assertLess(time.time() - start, 30)
+
+        # the file is skipped, the replaced worker extracts the other files in the same order as without timeout
+        self.assertEqual([r['path'] for r in records], [f.path for f in find_source_files(self.path)])
+        self.assertTrue(records[2]['skipped'].startswith('Timeout after 1s'))
+        self.assertEqual(records[2]['skip_reason'], 'timeout')
+        for record in records[3:]:
+            self.assertIsNone(record['skipped'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import os
+import json
+import stat
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from coastSHARK.util.error import CoastException
+from coastSHARK.util.parallel import Extractor
+from coastSHARK.util.server import JobServer, send_job
+from coastSHARK.util.timing import timings
+
+
+class FakeExtractor(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeJobServer(JobServer):
+    """Runs the jobs without MongoDB, a job with revision fail raises."""
+
+    def run_job(self, job, send):
+        self.jobs += 1
+        if job['revision'] == 'fail':
+            raise CoastException('broken job')
+        for files in range(1, 4):
+            timings.add_file('f{}.py'.format(files), 10, {'parse': 0.1})
+            send({'event': 'progress', 'revision': job['revision'], 'files': files})
+        return {'revisions': 1, 'files': 3, 'seconds': 0.0}
+
+
+class TestJobServer(unittest.TestCase):
+    """The server has to answer every job and keep running after errors until it is stopped."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.path, 'coastshark.sock')
+        self.extractor = FakeExtractor()
+        self.server = FakeJobServer(self.socket_path, self.extractor, {}, timing_report=os.path.join(self.path, 'timing.json'))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+        # wait until the server listens
+        while self.server._socket is None:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            list(send_job(self.socket_path, {'command': 'stop'}))
+        self.thread.join()
+        shutil.rmtree(self.path)
+
+    def test_jobs(self):
+        messages = list(send_job(self.socket_path, {'revision': 'a'}))
+        self.assertEqual([m['event'] for m in messages], ['progress', 'progress', 'progress', 'done'])
+        self.assertEqual(messages[-1]['files'], 3)
+
+        messages = list(send_job(self.socket_path, {'revision': 'fail'}))
+        self.assertEqual(messages, [{'event': 'error', 'message': 'broken job'}])
+
+        # the server is still running after the failed job
+        messages = list(send_job(self.socket_path, {'revision': 'b'}))
+        self.assertEqual(messages[-1]['event'], 'done')
+
+    def test_stop(self):
+        list(send_job(self.socket_path, {'revision': 'a'}))
+        messages = list(send_job(self.socket_path, {'command': 'stop'}))
+        self.assertEqual(messages, [{'event': 'stopped', 'jobs': 1}])
+
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertTrue(self.extractor.closed)
+
+    def test_socket_mode(self):
+        # no access for the group and other users
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode) & 0o077, 0)
+
+    def test_timings_per_job(self):
+        list(send_job(self.socket_path, {'revision': 'a'}))
+        list(send_job(self.socket_path, {'revision': 'b'}))
+
+        # the timings are written per job and cleared afterwards
+        self.assertEqual(timings.files, [])
+        for job in [1, 2]:
+            with open(os.path.join(self.path, 'timing.{}.json'.format(job)), 'r') as f:
+                self.assertEqual(json.load(f)['files']['count'], 3)
+
+    def test_already_running(self):
+        with self.assertRaises(CoastException):
+            FakeJobServer(self.socket_path, FakeExtractor(), {}).serve_forever()
+
+
+class FakeMongoDb(object):
+    """Records the calls of the server, connecting to the project broken fails."""
+
+    instances = []
+
+    def __init__(self, project_name, vcs_url, revision, **db):
+        self.project_name = project_name
+        self.revision = revision
+        self.connects = 0
+        self.revisions = []
+        self.paths = []
+        self.flushes = 0
+        FakeMongoDb.instances.append(self)
+
+    def connect(self):
+        if self.project_name == 'broken':
+            raise CoastException('project not found')
+        self.connects += 1
+
+    def set_revision(self, revision):
+        self.revision = revision
+        self.revisions.append(revision)
+
+    def write_imports(self, filepath, imports):
+        self.paths.append(filepath)
+
+    def write_node_type_counts(self, filepath, node_count, node_type_counts):
+        pass
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestRunJob(unittest.TestCase):
+    """The real job path of the server with a fake MongoDb."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.input = os.path.join(self.path, 'repository')
+        os.makedirs(os.path.join(self.input, 'pkg'))
+        for name in ['a.py', 'pkg/b.py']:
+            with open(os.path.join(self.input, name), 'w') as f:
+                f.write('import os\n')
+
+        FakeMongoDb.instances = []
+        patcher = mock.patch('coastSHARK.util.server.MongoDb', FakeMongoDb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.socket_path = os.path.join(self.path, 'coastshark.sock')
+        self.server = JobServer(self.socket_path, Extractor(), {}, progress_interval=1)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        while self.server._socket is None:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        list(send_job(self.socket_path, {'command': 'stop'}))
+        self.thread.join()
+        shutil.rmtree(self.path)
+
+    def job(self, revision, project_name='project'):
+        return list(send_job(self.socket_path, {'input': self.input, 'repository_url': 'http://example.com/repo', 'project_name': project_name, 'revision': revision}))
+
+    def test_reuse_connection(self):
+        first = self.job('r1')
+        second = self.job('r2')
+
+        self.assertEqual([m['event'] for m in first], ['started', 'progress', 'progress', 'done'])
+        self.assertEqual(second[-1]['event'], 'done')
+        self.assertEqual((second[-1]['revisions'], second[-1]['files']), (1, 2))
+
+        # one MongoDb connected once for both jobs, the second job only switches the revision
+        self.assertEqual(len(FakeMongoDb.instances), 1)
+        m = FakeMongoDb.instances[0]
+        self.assertEqual(m.connects, 1)
+        self.assertEqual(m.revisions, ['r2'])
+        self.assertEqual(m.paths, ['a.py', 'pkg/b.py'] * 2)
+        self.assertEqual(m.flushes, 2)
+
+    def test_errors(self):
+        messages = list(send_job(self.socket_path, {'input': self.input, 'repository_url': 'http://example.com/repo', 'revision': 'r1', 'revisions': ['r2']}))
+        self.assertEqual(messages, [{'event': 'error', 'message': 'a job needs exactly one of revision, revisions or revision_range'}])
+
+        messages = self.job('r1', project_name='broken')
+        self.assertEqual([m['event'] for m in messages], ['started', 'error'])
+        self.assertEqual(messages[-1]['message'], 'project not found')
+
+        # the failed connection is not kept, the server still takes jobs
+        self.assertEqual(self.job('r1')[-1]['event'], 'done')
+        self.assertEqual([m.connects for m in FakeMongoDb.instances], [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
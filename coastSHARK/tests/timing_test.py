@@ -0,0 +1,57 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from coastSHARK.util.timing import Timings, percentile
+
+
+class TestTimings(unittest.TestCase):
+    """The summary has to contain the totals, percentiles and the slowest files."""
+
+    def setUp(self):
+        self.timings = Timings()
+        for i in range(1, 101):
+            self.timings.add_file('f{}.py'.format(i), i * 10, {'read': 0.001, 'parse': i / 100.0})
+        self.timings.add('mongo_write', 0.5)
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), 0)
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertEqual(percentile(list(range(101)), 50), 50)
+        self.assertEqual(percentile(list(range(101)), 95), 95)
+
+    def test_summary(self):
+        s = self.timings.summary(top=3)
+        self.assertEqual(s['phases']['parse']['count'], 100)
+        self.assertAlmostEqual(s['phases']['parse']['total'], 50.5)
+        self.assertAlmostEqual(s['phases']['parse']['max'], 1.0)
+        self.assertEqual(s['phases']['mongo_write']['count'], 1)
+        self.assertEqual(s['phases']['2to3']['count'], 0)
+
+        self.assertEqual(s['files']['count'], 100)
+        self.assertEqual(s['files']['bytes'], 50500)
+        self.assertEqual([f['path'] for f in s['files']['slowest']], ['f100.py', 'f99.py', 'f98.py'])
+
+    def test_measure(self):
+        with self.timings.measure('mongo_lookup'):
+            pass
+        self.assertEqual(len(self.timings.phases['mongo_lookup']), 1)
+
+    def test_report(self):
+        filename = os.path.join(self.path, 'timing.json')
+        self.timings.write_report(filename, top=5)
+        with open(filename, 'r') as f:
+            report = json.load(f)
+        self.assertEqual(len(report['files']['slowest']), 5)
+        self.assertEqual(len(report['files']['all']), 100)
+        self.assertEqual(report['files']['all'][0]['phases'], {'read': 0.001, 'parse': 0.01})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+from coastSHARK.util.extract_ast import NODE_TYPES, new_type_counts
+from coastSHARK.util.write_csv import open_output_file, sidecar_filename, FORMATS
+
+METHOD = {'package_name': 'de.ugoe.cs', 'class_name': 'Test$1', 'method_name': 'run', 'return_type': 'Void', 'parameter_types': ['int', '[String'],
+          'cognitive_complexity_sonar': 3, 'cyclomatic_complexity': 2, 'is_interface_method': False}
+
+
+class TestOutputFiles(unittest.TestCase):
+    """Every format has to contain the same data."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.counts = new_type_counts()
+        self.counts[NODE_TYPES.index('Import')] = 2
+        self.counts[NODE_TYPES.index('MethodDeclaration')] = 1
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, output_format):
+        filename = os.path.join(self.path, 'my.project.' + ('csv.gz' if output_format == 'sparse' else output_format))
+        m = open_output_file(filename, output_format)
+        m.write_line('a/B.java', ['java.util.List', 'java.io.*'], 3, self.counts)
+        m.write_method_metrics('a/B.java', [METHOD])
+        m.close()
+        return filename
+
+    def _read(self, filename):
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filename, 'rt', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def test_sidecar_filename(self):
+        self.assertEqual(sidecar_filename('ast.csv', 'methods'), 'ast.methods.csv')
+        self.assertEqual(sidecar_filename('/tmp/out/ast.csv.gz', 'files'), '/tmp/out/ast.files.csv.gz')
+        self.assertEqual(sidecar_filename('my.project.csv', 'methods'), 'my.project.methods.csv')
+        self.assertEqual(sidecar_filename('/tmp/v1.2/my.project.jsonl.gz', 'methods'), '/tmp/v1.2/my.project.methods.jsonl.gz')
+
+    def test_csv(self):
+        for output_format in ['csv', 'csv.gz']:
+            rows = list(csv.DictReader(self._read(self._write(output_format)).splitlines()))
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(list(rows[0].keys()), ['path', 'imports', 'node_count'] + NODE_TYPES)
+            self.assertEqual(rows[0]['imports'], 'java.util.List java.io.*')
+            self.assertEqual(rows[0]['Import'], '2')
+            self.assertEqual(rows[0]['Num'], '0')
+
+    def test_jsonl(self):
+        for output_format in ['jsonl', 'jsonl.gz']:
+            lines = self._read(self._write(output_format)).splitlines()
+            self.assertEqual(json.loads(lines[0]), {'path': 'a/B.java', 'imports': ['java.util.List', 'java.io.*'], 'node_count': 3, 'type_counts': {'Import': 2, 'MethodDeclaration': 1}})
+
+    def test_sparse(self):
+        filename = self._write('sparse')
+        triplets = list(csv.reader(self._read(filename).splitlines()))
+        self.assertEqual(triplets[1:], [['0', str(NODE_TYPES.index('Import')), '2'], ['0', str(NODE_TYPES.index('MethodDeclaration')), '1']])
+
+        files = list(csv.reader(self._read(sidecar_filename(filename, 'files')).splitlines()))
+        self.assertEqual(files[1], ['0', 'a/B.java', 'java.util.List java.io.*', '3'])
+
+        types = list(csv.reader(self._read(sidecar_filename(filename, 'types')).splitlines()))
+        self.assertEqual([t[1] for t in types[1:]], NODE_TYPES)
+
+    def test_method_metrics(self):
+        for output_format in FORMATS:
+            rows = list(csv.DictReader(self._read(sidecar_filename(self._write(output_format), 'methods')).splitlines()))
+            self.assertEqual(rows[0]['path'], 'a/B.java')
+            self.assertEqual(rows[0]['parameter_types'], 'int [String')
+            self.assertEqual(rows[0]['cognitive_complexity_sonar'], '3')
+
+
+if __name__ == '__main__':
+    unittest.main()
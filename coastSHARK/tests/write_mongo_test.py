@@ -0,0 +1,153 @@
+import threading
+import unittest
+
+from pymongo.errors import BulkWriteError
+
+from coastSHARK.util.complexity_java import SourcemeterConversion
+from coastSHARK.util.error import CoastException
+from coastSHARK.util.write_mongo import BulkWriter, BackgroundWriter, match_method
+
+
+class FakeCollection(object):
+    """Records the bulk_write calls, fails every request for a s_key in fail."""
+
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = fail
+
+    def bulk_write(self, requests, ordered=True):
+        self.batches.append((requests, ordered))
+        errors = [{'index': i, 'code': 11000, 'errmsg': 'duplicate key'} for i, r in enumerate(requests) if r._filter['s_key'] in self.fail]
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+
+
+class BulkWriterTest(unittest.TestCase):
+
+    def test_merge(self):
+        c = FakeCollection()
+        w = BulkWriter(c, batch_size=10)
+        w.upsert('a', {'imports': ['os'], 'ce_type': 'file'})
+        w.upsert('b', {'imports': []})
+        w.upsert('a', {'metrics.node_count': 3, 'ce_type': 'file'})
+        self.assertEqual(c.batches, [])
+
+        w.close()
+        self.assertEqual(len(c.batches), 1)
+        requests, ordered = c.batches[0]
+        self.assertFalse(ordered)
+        self.assertEqual([r._filter for r in requests], [{'s_key': 'a'}, {'s_key': 'b'}])
+        self.assertEqual(requests[0]._doc, {'$set': {'imports': ['os'], 'ce_type': 'file', 'metrics.node_count': 3}})
+        self.assertTrue(requests[0]._upsert)
+        self.assertEqual(w.written, 2)
+
+    def test_batch_size(self):
+        c = FakeCollection()
+        w = BulkWriter(c, batch_size=2)
+        for s_key in 'abcde':
+            w.upsert(s_key, {'imports': []})
+        self.assertEqual([len(r) for r, _ in c.batches], [2, 2])
+
+        w.close()
+        self.assertEqual([len(r) for r, _ in c.batches], [2, 2, 1])
+
+    def test_interval(self):
+        c = FakeCollection()
+        w = BulkWriter(c, batch_size=100, interval=0)
+        w.upsert('a', {'imports': []})
+        self.assertEqual(len(c.batches), 1)
+
+    def test_errors(self):
+        c = FakeCollection(fail=('b',))
+        w = BulkWriter(c, batch_size=3)
+        for s_key in 'abcd':
+            w.upsert(s_key, {'imports': []})
+        self.assertEqual(w.errors, 1)
+        self.assertEqual(w.written, 2)
+
+        with self.assertRaises(CoastException):
+            w.close()
+        self.assertEqual(w.written, 3)
+
+    def test_finish(self):
+        c = FakeCollection(fail=('b',))
+        w = BulkWriter(c, batch_size=10)
+        w.upsert('a', {'imports': []})
+        w.upsert('b', {'imports': []})
+        with self.assertRaises(CoastException):
+            w.finish()
+
+        # the writer is used for the next job, only new errors raise
+        w.upsert('c', {'imports': []})
+        w.finish()
+        self.assertEqual((w.written, w.errors), (2, 1))
+
+
+class BackgroundWriterTest(unittest.TestCase):
+
+    def test_order(self):
+        written = []
+        w = BackgroundWriter(queue_size=2)
+        for i in range(100):
+            w.put(written.append, i)
+        w.close()
+        self.assertEqual(written, list(range(100)))
+
+    def test_backpressure(self):
+        release = threading.Event()
+        w = BackgroundWriter(queue_size=1)
+        w.put(release.wait)  # blocks the writer thread
+        w.put(lambda: None)  # fills the queue
+
+        t = threading.Thread(target=w.put, args=(lambda: None,))
+        t.start()
+        t.join(0.2)
+        self.assertTrue(t.is_alive())  # the queue is full
+
+        release.set()
+        t.join(5)
+        self.assertFalse(t.is_alive())
+        w.close()
+
+    def test_errors(self):
+        def fail(i):
+            if i == 1:
+                raise CoastException('write failed')
+
+        w = BackgroundWriter(queue_size=1)
+        with self.assertRaises(CoastException):
+            for i in range(100):
+                w.put(fail, i)
+        w.close()  # the error was already raised
+
+        w = BackgroundWriter()
+        w.put(fail, 1)
+        with self.assertRaises(CoastException):
+            w.close()
+        w.close()
+
+
+class MatchMethodTest(unittest.TestCase):
+
+    def method(self, parameter_types, return_type):
+        return {'package_name': 'de.ugoe.cs.coast', 'class_name': 'OverloadingTest', 'method_name': 'test1', 'parameter_types': parameter_types, 'return_type': return_type}
+
+    def test_single(self):
+        sc = SourcemeterConversion()
+        long_names = ['de.ugoe.cs.coast.OverloadingTest.test1(I)V']
+        self.assertEqual(match_method(sc, self.method(['long'], 'Void'), long_names), long_names[0])
+
+    def test_overloading(self):
+        sc = SourcemeterConversion()
+        long_names = ['de.ugoe.cs.coast.OverloadingTest.test1(J)V',
+                      'de.ugoe.cs.coast.OverloadingTest.test1(II)Ljava/lang/String;',
+                      'de.ugoe.cs.coast.OverloadingTest.test1(IIZ)Z']
+
+        self.assertEqual(match_method(sc, self.method(['long'], 'Void'), long_names), long_names[0])
+        self.assertEqual(match_method(sc, self.method(['int', 'int'], 'String'), long_names), long_names[1])
+        self.assertEqual(match_method(sc, self.method(['int', 'int', 'boolean'], 'boolean'), long_names), long_names[2])
+        self.assertIsNone(match_method(sc, self.method(['float'], 'Void'), long_names))
+
+
+if __name__ == '__main__':
+    unittest.main()
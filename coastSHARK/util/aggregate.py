@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""Aggregation of the node type count vectors of all files with NumPy.
+
+The count vectors are stacked into a matrix (files x node types in the order of NODE_TYPES) which is rolled up by directory, package and language.
+NumPy is optional, it is only needed if the aggregation is used.
+"""
+
+import os
+import csv
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import error
+from .extract_ast import NODE_TYPES
+
+GROUPINGS = ['directory', 'package', 'language']
+
+# percentiles of the number of nodes per file in a group
+PERCENTILES = [50, 90, 99]
+
+
+def file_language(path):
+    """Return python for .py files and java for all other files."""
+    if path.lower().endswith('.py'):
+        return 'python'
+    return 'java'
+
+
+def file_package(path, package):
+    """Return the package of a file, this is the package declaration for Java and the dotted directory for Python.
+
+    :param str path: The path of the file relative to the repository.
+    :param str package: The package declaration of a Java file or None.
+    """
+    if package is not None:
+        return package
+    return os.path.dirname(path).replace('/', '.')
+
+
+class Aggregator(object):
+    """Collects the count vectors of all files and rolls them up with NumPy."""
+
+    def __init__(self):
+        if np is None:
+            raise error.CoastException('the aggregation needs numpy, install it with pip install numpy')
+
+        self.paths = []
+        self._keys = {g: [] for g in GROUPINGS}
+        self._node_counts = array('I')
+        self._counts = array('I')  # the count vectors of all files one after another
+
+    def add(self, record):
+        """Add the counts of one extracted file.
+
+        :param dict record: The record of the file, see extract_file.
+        """
+        path = record['path']
+        self.paths.append(path)
+        self._keys['directory'].append(os.path.dirname(path))
+        self._keys['package'].append(file_package(path, record['package']))
+        self._keys['language'].append(file_language(path))
+        self._node_counts.append(record['node_count'])
+        self._counts.extend(record['type_counts'])
+
+    def matrix(self):
+        """Return the counts of all files as matrix with one row per file and one column per node type in NODE_TYPES."""
+        if not self.paths:
+            return np.zeros((0, len(NODE_TYPES)), dtype=np.uintc)
+        return np.frombuffer(self._counts, dtype=np.uintc).reshape(-1, len(NODE_TYPES))
+
+    def node_counts(self):
+        """Return the number of nodes per file."""
+        return np.frombuffer(self._node_counts, dtype=np.uintc) if self.paths else np.zeros(0, dtype=np.uintc)
+
+    def rollup(self, grouping):
+        """Sum the counts per group.
+
+        :param str grouping: One of GROUPINGS.
+        :return: tuple of groups, files per group, node count per group, node count percentiles per group and the node type totals per group
+        """
+        groups, inverse = np.unique(np.array(self._keys[grouping], dtype=str), return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        # sort the files by group so that every group is one contiguous block of rows
+        order = np.argsort(inverse, kind='stable')
+        files = np.bincount(inverse, minlength=len(groups))
+        starts = np.concatenate(([0], np.cumsum(files)[:-1])).astype(np.intp)
+
+        node_counts = self.node_counts()[order].astype(np.uint64)
+        if len(groups) == 0:
+            return groups, files, node_counts, np.zeros((0, len(PERCENTILES))), np.zeros((0, len(NODE_TYPES)), dtype=np.uint64)
+
+        totals = np.add.reduceat(self.matrix()[order].astype(np.uint64), starts, axis=0)
+        node_totals = np.add.reduceat(node_counts, starts)
+        percentiles = np.array([np.percentile(block, PERCENTILES) for block in np.split(node_counts, starts[1:])])
+        return groups, files, node_totals, percentiles, totals
+
+    def write_rollups(self, directory):
+        """Write one csv file per grouping, e.g., ast_by_directory.csv, with the totals and node count percentiles per group.
+
+        :param str directory: The directory for the csv files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for grouping in GROUPINGS:
+            groups, files, node_totals, percentiles, totals = self.rollup(grouping)
+
+            with open(os.path.join(directory, 'ast_by_{}.csv'.format(grouping)), 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow([grouping, 'files', 'node_count'] + ['node_count_p{}'.format(p) for p in PERCENTILES] + NODE_TYPES)
+                for i, group in enumerate(groups):
+                    w.writerow([group, files[i], node_totals[i]] + ['{:g}'.format(p) for p in percentiles[i]] + totals[i].tolist())
+
+    def save_matrix(self, filename):
+        """Save the matrix for further analysis.
+
+        A .npy file only contains the matrix, a .npz file also contains the node counts, the paths of the files (rows) and the node types (columns).
+
+        :param str filename: The file name, ending in .npy or .npz.
+        """
+        if filename.endswith('.npy'):
+            np.save(filename, self.matrix())
+        else:
+            np.savez_compressed(filename, counts=self.matrix(), node_count=self.node_counts(), paths=np.array(self.paths, dtype=str), node_types=np.array(NODE_TYPES, dtype=str))
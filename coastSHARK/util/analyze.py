@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Analysis of one or more revisions with the results written to the MongoDB.
+
+This is shared by the plugin, which analyzes the revisions of one run, and the server, which keeps the extractor for many jobs.
+"""
+
+import os
+import logging
+
+from . import error
+from .parallel import find_source_files, extract_revision
+from .write_mongo import BackgroundWriter
+
+
+def check_input(input_path):
+    """Check that the repository directory is readable and return it with a trailing slash.
+
+    :param str input_path: Path to the checked out repository directory.
+    """
+    if not os.path.isdir(input_path):
+        raise error.CoastException('--input {} is not valid'.format(input_path))
+    if not os.access(input_path, os.R_OK):
+        raise error.CoastException('--input {} is not readable'.format(input_path))
+    if not input_path.endswith('/'):
+        input_path += '/'
+        logging.getLogger('coastSHARK').info('appending / to input')
+    return input_path
+
+
+def write_record(m, record):
+    """Write the extracted data of one file to the MongoDB."""
+    if record['skipped']:
+        logging.getLogger('coastSHARK').info(record['skipped'])
+        return
+
+    m.write_imports(record['path'], record['imports'])
+    m.write_node_type_counts(record['path'], record['node_count'], record['type_counts'])
+    if record['method_metrics'] is not None:
+        m.write_method_metrics(record['path'], record['method_metrics'])
+
+
+def analyze(m, extractor, input_path, revisions, repository=None, queue_size=1000, progress=None, discovery=None):
+    """Extract the files of all revisions and write them to the MongoDB from a BackgroundWriter.
+
+    Without a repository the checked out working tree in input_path is analyzed as the first revision.
+    With a repository the files are read from the git objects, the records of files which did not change are re-written for the
+    following revisions without parsing them again.
+
+    :param MongoDb m: The connected MongoDb, the buffered updates are not flushed here.
+    :param Extractor extractor: The extractor, it is not closed here.
+    :param str input_path: Path to the repository with a trailing slash.
+    :param list revisions: The revision hashes.
+    :param GitRepository repository: The repository to read from or None.
+    :param int queue_size: Number of records which may wait for the writer thread.
+    :param callable progress: Called with the revision and the number of records of the revision after every record.
+    :param Discovery discovery: The ignore rules, None only prunes the default directories.
+    :return: The number of records of all revisions.
+    """
+    writer = BackgroundWriter(queue_size)
+    total = 0
+
+    try:
+        if repository is None:
+            for record in extractor.extract(find_source_files(input_path, discovery)):
+                writer.put(write_record, m, record)
+                total += 1
+                if progress is not None:
+                    progress(revisions[0], total)
+
+        else:
+            previous = {}
+            # m.revision is changed by the writer thread, connect already resolved the commit of its revision
+            current = m.revision
+            for revision in revisions:
+                if revision != current:
+                    writer.put(m.set_revision, revision)
+                    current = revision
+                for count, record in enumerate(extract_revision(extractor, repository, revision, previous, discovery), 1):
+                    writer.put(write_record, m, record)
+                    total += 1
+                    if progress is not None:
+                        progress(revision, count)
+
+        # errors of the writer thread are raised here
+        writer.close()
+
+    # the writer thread has to stop before the caller flushes and closes the MongoDb
+    finally:
+        writer.close()
+
+    return total
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Persistent local cache for extraction results.
+
+Results are stored in a SQLite database keyed by the git blob hash of the file content and the extractor version.
+Files which did not change between two revisions therefore only have to be parsed once.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+from array import array
+
+# increment this if the extraction results change, the python version is included because the ast node types depend on it
+CACHE_VERSION = 'coastSHARK-4-py{}.{}'.format(*sys.version_info[:2])
+
+CACHE_FILENAME = 'coastshark_cache.sqlite'
+
+
+def blob_hash(data):
+    """Return the git blob SHA-1 of the content, this is the same hash as in git ls-files -s or git ls-tree.
+
+    :param bytes data: The raw file content.
+    """
+    h = hashlib.sha1()
+    h.update('blob {}\0'.format(len(data)).encode('ascii'))
+    h.update(data)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """Maps blob hashes to the imports, node counts, type counts and method metrics of a file."""
+
+    def __init__(self, directory, commit_every=500):
+        """Open (or create) the cache in the given directory.
+
+        :param str directory: Directory where the cache file is kept.
+        :param int commit_every: Number of put calls after which the transaction is committed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._commit_every = commit_every
+        self._pending = 0
+
+        self._db = sqlite3.connect(os.path.join(directory, CACHE_FILENAME), timeout=60)
+        self._db.execute('PRAGMA journal_mode=WAL')  # readers in the worker processes do not block the writer
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (blob TEXT NOT NULL, version TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (blob, version))')
+        self._db.commit()
+
+    def get(self, blob, method_metrics=False):
+        """Return the cached result for the blob or None.
+
+        :param str blob: The git blob hash of the file.
+        :param bool method_metrics: The result needs to contain method metrics, results without them are a miss.
+        """
+        row = self._db.execute('SELECT data FROM results WHERE blob = ? AND version = ?', (blob, CACHE_VERSION)).fetchone()
+        if row is None:
+            return None
+
+        data = json.loads(row[0])
+        if method_metrics and data['method_metrics'] is None:
+            return None
+        data['type_counts'] = array('I', data['type_counts'])
+        return data
+
+    def put(self, blob, record):
+        """Store the extraction result of a record under its blob hash.
+
+        :param str blob: The git blob hash of the file.
+        :param dict record: The record as returned by the extraction.
+        """
+        data = {k: record[k] for k in ('imports', 'node_count', 'method_metrics', 'package', 'converted_2to3')}
+        data['type_counts'] = record['type_counts'].tolist()
+        self._db.execute('INSERT OR REPLACE INTO results (blob, version, data) VALUES (?, ?, ?)', (blob, CACHE_VERSION, json.dumps(data)))
+
+        self._pending += 1
+        if self._pending >= self._commit_every:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
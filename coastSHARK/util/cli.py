@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+"""Command line arguments shared by the plugin and the server.
+
+These are the MongoDB arguments of pycoshark.utils.get_base_argparser, pycoshark is not imported here because it imports mongoengine
+and the models. That way --help and argument errors do not load the MongoDB packages.
+"""
+
+import argparse
+
+
+def get_base_argparser(description, version):
+    """Return an ArgumentParser with the version and the MongoDB arguments, the same as pycoshark.utils.get_base_argparser.
+
+    :param str description: The description of the program.
+    :param str version: The version shown by --version.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-v', '--version', help='Shows the version', action='version', version=version)
+    parser.add_argument('-U', '--db-user', help='Database user name', default=None)
+    parser.add_argument('-P', '--db-password', help='Database user password', default=None)
+    parser.add_argument('-DB', '--db-database', help='Database name', default='smartshark')
+    parser.add_argument('-H', '--db-hostname', help='Name of the host, where the database server is running', default='localhost')
+    parser.add_argument('-p', '--db-port', help='Port, where the database server is listening', default=27017, type=int)
+    parser.add_argument('-a', '--db-authentication', help='Name of the authentication database', default=None)
+    parser.add_argument('--ssl', help='Enables SSL', default=False, action='store_true')
+    return parser
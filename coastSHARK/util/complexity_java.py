@@ -3,8 +3,8 @@
 """In this module we extract complexity measures from Java ASTs."""
 
 import logging
-import copy
 import re
+from collections import namedtuple
 
 import javalang
 
@@ -25,6 +25,38 @@ JAVA_BRANCH_TYPES_MCCC = [
 
 JAVA_SEQUENCE_TYPES = ['&&', '||']
 
+JAVA_CLASS_TYPES = ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration']
+
+# classification of a javalang node class, this is used instead of comparing type names for every node
+NodeTypeFlags = namedtuple('NodeTypeFlags', ['branch', 'mccc', 'nesting', 'binop', 'invocation', 'method', 'constructor', 'named_class', 'class_creator', 'package'])
+
+# node class -> NodeTypeFlags, filled on first use by node_type_flags
+_node_type_flags = {}
+
+
+def node_type_flags(node_type):
+    """Return the NodeTypeFlags of a javalang node class, they are only computed once per class.
+
+    :param type node_type: The class of the node, e.g., javalang.tree.IfStatement
+    """
+    flags = _node_type_flags.get(node_type)
+    if flags is None:
+        name = node_type.__name__
+        flags = NodeTypeFlags(
+            branch=name in JAVA_BRANCH_TYPES or name == 'TryStatement',
+            mccc=name in JAVA_BRANCH_TYPES_MCCC,
+            nesting=name in JAVA_NESTING_TYPES,
+            binop=name == 'BinaryOperation',
+            invocation=name == 'MethodInvocation',
+            method=name == 'MethodDeclaration',
+            constructor=name == 'ConstructorDeclaration',
+            named_class=name in JAVA_CLASS_TYPES,
+            class_creator=name == 'ClassCreator',
+            package=name == 'PackageDeclaration',
+        )
+        _node_type_flags[node_type] = flags
+    return flags
+
 SM_DT = {'I': 'int', 'J': 'long', 'V': 'Void', 'Z': 'boolean', 'F': 'float', 'C': 'char', 'B': 'byte', 'D': 'double'}
 
 SM_DT_INV = {v.lower(): k for k, v in SM_DT.items()}
@@ -200,8 +232,6 @@ class ComplexityJava(object):
         self.ast = compilation_unit_ast
         self._log = logging.getLogger('coastSHARK')
 
-        self._binop = re.compile('binop:"(!?\W+)"')  # used to match operators for sequence changes
-
     def _method_params(self, method):
         """Extract method parameter and return types, we already do some Sourcmeter notations here, e.g., [ for array."""
         ret_type = 'Void'
@@ -240,131 +270,142 @@ class ComplexityJava(object):
             params.append(name)
         return params, ret_type
 
-    def _find_max_level(self):
-        """Find maximal level for Counting anonymous Classes.
+    def _class_name(self, node):
+        """Return class name in Sourcemeter notation.
+
+        The names are cached per class node, the classes are collected by _parse_level_positions.
 
-        A normal ClassDeclaration counts as one level, a ClassCreator counts only if it has inline methods defined.
+        :param node: The innermost ClassDeclaration, InterfaceDeclaration, EnumDeclaration or ClassCreator with methods, None returns an empty name.
         """
-        max_level = 0
-        for path, method in self.ast:
-
-            if type(method).__name__ != 'MethodDeclaration':
-                continue
-
-            level = 0
-            for i, p in enumerate(path):
-                if type(p).__name__ == 'ClassDeclaration':
-                    level += 1
-                if type(p).__name__ == 'ClassCreator':
-                    if 'MethodDeclaration' in [type(n).__name__ for n in path[i + 1]]:
-                        level += 1
-
-            if level > max_level:
-                max_level = level
-        return max_level + 1
-
-    def _class_name(self, path):
-        """Return class name in Sourcemeter notation."""
-        names = []
-        for i, n in enumerate(path):
-            class_name = '$'.join(names)
-            if type(n).__name__ in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration']:
+        if node is None:
+            return ''
+
+        if id(node) not in self._class_names.keys():
+            parent, inline_class = self._classes[id(node)]
+
+            if type(node).__name__ in JAVA_CLASS_TYPES:
 
                 # in this case we have a named class inside a method we prepend the counter ala $1NamedClass
-                if type(path[i - 2]).__name__ == 'MethodDeclaration':
-                    names.append(str(self._count_map[n.position[0]][1]) + n.name)
+                if inline_class:
+                    name = str(self._count_map[node.position[0]][1]) + node.name
 
                 # normal named class, just append the name
                 else:
-                    names.append(n.name)
-            elif type(n).__name__ == 'ClassCreator' and self._has_immediate_method(n):
-                names.append(str(self._count_map[n.position[0]][0]))
-        class_name = '$'.join(names)
-        return class_name
+                    name = node.name
+            else:
+                name = str(self._count_map[node.position[0]][0])
+
+            names = [self._class_name(parent), name]
+            self._class_names[id(node)] = '$'.join([n for n in names if n])
+        return self._class_names[id(node)]
 
     def _has_immediate_method(self, node):
-        """Check if the node has a method."""
-        for _, n1 in node:
-            if type(n1).__name__ == 'MethodDeclaration' and len(_) == 2:
+        """Check if the node has a method, i.e., a MethodDeclaration directly inside one of its lists, e.g., the body of a ClassCreator."""
+        for child in node.children:
+            if isinstance(child, (list, tuple)) and 'MethodDeclaration' in [type(n).__name__ for n in child]:
                 return True
         return False
 
-    def _parent_pos(self, path):
-        """Return parent position for our relevant node types."""
-        first = None
-        for n in reversed(path):
-            if type(n).__name__ not in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration', 'ClassCreator']:
-                continue
-            if type(n).__name__ in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration']:
-                first = n
-                break
-            if type(n).__name__ == 'ClassCreator' and self._has_immediate_method(n):
-                first = n
-                break
-        return first.position[0]
-
-    def _parse_level_positions(self, ast, max_level=10):
-        """Count positions and levels for our relevant node types."""
-        for current_level in range(1, max_level):
-            for path, node in ast:
-                # these do not count towards levels
-                if type(node).__name__ not in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration', 'ClassCreator']:
-                    continue
-
-                # these count towards the levels
-                level = 0
-                for i, n in enumerate(path):
-                    if type(n).__name__ in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration']:
-                        level += 1
-                    if type(n).__name__ == 'ClassCreator' and self._has_immediate_method(n):
-                        level += 1
-
-                # evaluate the current level
-                if level == current_level:
-
-                    # we do only count classCreator nodes with inline methods
-                    if type(node).__name__ == 'ClassCreator' and not self._has_immediate_method(node):
-                        continue
-                    parent_pos = self._parent_pos(path)
-                    line = node.position[0]
-
-                    # sadly, we need two lists, one for ClassCreators with methods and another for named classes that are defined inside methods
-                    if parent_pos not in self._level_map.keys():
-                        self._level_map[parent_pos] = 0
-
-                    if parent_pos not in self._level_map2.keys():
-                        self._level_map2[parent_pos] = 0
-
-                    # only count pos for inline classes in methods
-                    if type(node).__name__ in ['ClassDeclaration', 'InterfaceDeclaration', 'EnumDeclaration'] and type(path[i - 1]).__name__ == 'MethodDeclaration':
-                        self._level_map2[parent_pos] += 1
-                    # or inline class creators with methods
-                    if type(node).__name__ == 'ClassCreator' and self._has_immediate_method(node):
-                        self._level_map[parent_pos] += 1
-
-                    pos1 = self._level_map[parent_pos]
-                    pos2 = self._level_map2[parent_pos]
-                    self._count_map[line] = (pos1, pos2)
+    def _parse_level_positions(self):
+        """Count positions and levels for our relevant node types in one traversal of the AST.
+
+        The same traversal collects the package, the methods and the classes with their parent classes for _class_name.
+
+        A named class counts as one level, a ClassCreator counts only if it has inline methods defined.
+        The positions are counted level by level and in traversal order inside a level.
+        Only levels up to the maximal level of a MethodDeclaration are counted, here a named class counts only if it is a ClassDeclaration
+        and a ClassCreator only if the list which contains the method belongs to it.
+        """
+        nodes = []  # (level, node, parent, inline class in method) of the relevant nodes in traversal order
+        max_level = 0
+
+        path = []
+        levels = [(0, 0, None)]  # levels[d] is (level, level for methods, parent class node) of a node at depth d
+        stack = [(self.ast, 0)]
+        while stack:
+            obj, depth = stack.pop()
+            del path[depth:]
+            del levels[depth + 1:]
+            level, method_level, parent = levels[depth]
+
+            if isinstance(obj, javalang.ast.Node):
+                flags = node_type_flags(type(obj))
+                if flags.method and method_level > max_level:
+                    max_level = method_level
+
+                # we only are interested in methods and constructors
+                if flags.method or flags.constructor:
+                    self._methods.append((obj, parent))
+
+                if flags.package:
+                    self._package = obj.name
+
+                if flags.named_class:
+                    inline_class = type(path[-2]).__name__ == 'MethodDeclaration'
+                    nodes.append((level, obj, parent, inline_class))
+                    self._classes[id(obj)] = (parent, inline_class)
+                    levels.append((level + 1, method_level + (type(obj).__name__ == 'ClassDeclaration'), obj))
+
+                # we do only count classCreator nodes with inline methods
+                elif flags.class_creator and self._has_immediate_method(obj):
+                    nodes.append((level, obj, parent, False))
+                    self._classes[id(obj)] = (parent, False)
+                    levels.append((level + 1, method_level, obj))
+
+                else:
+                    levels.append((level, method_level, parent))
+                children = obj.children
+
+            else:
+                if node_type_flags(type(path[-1])).class_creator and 'MethodDeclaration' in [type(n).__name__ for n in obj]:
+                    method_level += 1
+                levels.append((level, method_level, parent))
+                children = obj
+
+            path.append(obj)
+            for child in reversed(children):
+                if isinstance(child, (javalang.ast.Node, list, tuple)):
+                    stack.append((child, depth + 1))
+
+        # sorted is stable so the traversal order inside a level is kept
+        nodes = sorted([n for n in nodes if 1 <= n[0] <= max_level], key=lambda n: n[0])
+        for level, node, parent, inline_class in nodes:
+            parent_pos = parent.position[0]
+            line = node.position[0]
+
+            # sadly, we need two lists, one for ClassCreators with methods and another for named classes that are defined inside methods
+            if parent_pos not in self._level_map.keys():
+                self._level_map[parent_pos] = 0
+
+            if parent_pos not in self._level_map2.keys():
+                self._level_map2[parent_pos] = 0
+
+            # only count pos for inline classes in methods
+            if inline_class:
+                self._level_map2[parent_pos] += 1
+            # or inline class creators with methods
+            if type(node).__name__ == 'ClassCreator':
+                self._level_map[parent_pos] += 1
+
+            pos1 = self._level_map[parent_pos]
+            pos2 = self._level_map2[parent_pos]
+            self._count_map[line] = (pos1, pos2)
 
     def cognitive_complexity(self):
         """Extract complexity metrics for all methods of the current file."""
         self._level_map = {}
         self._level_map2 = {}
         self._count_map = {}
+        self._classes = {}  # id of class node -> (parent class node, named class inside a method)
+        self._class_names = {}
+        self._methods = []  # (method node, class node) in traversal order
+        self._package = None
 
-        self._parse_level_positions(self.ast, self._find_max_level())
-
-        package = None
-        for path, node in self.ast.filter(javalang.tree.PackageDeclaration):
-            package = node.name
+        self._parse_level_positions()
+        package = self._package
 
-        for path, method in self.ast:
-
-            # we only are interested in methods and constructors
-            if type(method).__name__ not in ['MethodDeclaration', 'ConstructorDeclaration']:
-                continue
-
-            full_name = self._class_name(path)
+        for method, class_node in self._methods:
+            full_name = self._class_name(class_node)
 
             method_name = method.name
             if type(method).__name__ in 'ConstructorDeclaration':
@@ -373,8 +414,7 @@ class ComplexityJava(object):
             self._log.debug('evaluating package {}, class {}, method {}'.format(package, full_name, method_name))
 
             # gather metrics from the metric ast
-            cogcs = self.cognitive_complexity_sonar(method)
-            cc = self.cyclomatic_complexity(method)
+            cogcs, cc = self._method_metrics(method)
 
             params, ret_type = self._method_params(method)
 
@@ -387,77 +427,107 @@ class ComplexityJava(object):
 
         Description here: https://www.sonarsource.com/docs/CognitiveComplexity.pdf
         """
-        cogcs = 0
-        cogcs += self._nesting(method)
-        cogcs += self._binop_cc(method)
-        cogcs += self._recursion(method)
-        return cogcs
+        return self._method_metrics(method)[0]
 
     def cyclomatic_complexity(self, method):
         """Extract cyclomatic complexity (not really, we just count branch types)."""
-        cc = 1
-        for c, n in method:
-            if type(n).__name__ in JAVA_BRANCH_TYPES_MCCC:
-                cc += 1
-        return cc
+        return self._method_metrics(method)[1]
 
-    def _sequence_key(self, path):
-        # 1. remove BinaryOperator from path until parent object is reached
-        basepath = copy.deepcopy(path)
+    def _method_metrics(self, method):
+        """Extract cognitive complexity and cyclomatic complexity in one traversal of the method.
 
-        while type(basepath[-1]).__name__ in ['BinaryOperation', 'list']:
-            basepath = basepath[:-1]
-            if type(basepath[-1]).__name__ == 'BinaryOperation' and basepath[-1].operator not in JAVA_SEQUENCE_TYPES:
-                basepath = basepath[:-1]
-                continue
-
-        # 2. use the position of the parent of the BinaryOperation, e.g., if, while as key
-        if not basepath[-1].position:
-            raise Exception('no position for: {}'.format(basepath[-1]))
-        return basepath[-1].position[0]
-
-    def _recursion(self, method):
-        """
-        Detect recursion in method.
+        The traversal visits the nodes in the same order as javalangs walk_tree.
+        Cognitive complexity consists of the branches with their nesting level, sequences of binary operations and recursion.
 
         This has drawbacks! We will count recursion if we call a method of the same name as the current but with different attributes.
         We do not have the ability to discern attribute types only names and number of attributes.
+
+        :param method: MethodDeclaration or ConstructorDeclaration node
+        :return: tuple of cognitive complexity and cyclomatic complexity
         """
-        cc = 0
-        for p, n in method:
-            if type(n).__name__ == 'MethodInvocation':
-                if n.member == method.name:
+        cogcs = 0
+        cc = 1
+        sequences = {}  # sequence key -> nodes of the first binop with this key in prefix notation
+        collecting = []  # (depth, nodes) for the sequences whose subtree we are currently in
+
+        path = []  # ancestors of the current node, including lists
+        nesting = [0]  # nesting[d] is the nesting level of a node at depth d
+        stack = [(method, 0)]
+        while stack:
+            obj, depth = stack.pop()
+            del path[depth:]
+            del nesting[depth + 1:]
+            while collecting and collecting[-1][0] >= depth:
+                collecting.pop()
+
+            if isinstance(obj, javalang.ast.Node):
+                flags = node_type_flags(type(obj))
+                if flags.branch:
+                    cogcs += 1 + nesting[depth]
+                    self._log.debug('[nest] {} increase cc to {} including nesting {}'.format(type(obj).__name__, cogcs, nesting[depth]))
+
+                if flags.mccc:
                     cc += 1
-        return cc
+
+                if flags.invocation and obj.member == method.name:
+                    cogcs += 1
+
+                for _, nodes in collecting:
+                    nodes.append(obj)
+
+                # this should be the first binop per key
+                if flags.binop and obj.operator in JAVA_SEQUENCE_TYPES:
+                    key = self._sequence_key(tuple(path))
+                    if key not in sequences.keys():
+                        sequences[key] = [obj]
+                        collecting.append((depth, sequences[key]))
+
+                nesting.append(nesting[depth] + flags.nesting)
+                children = obj.children
+            else:
+                nesting.append(nesting[depth])
+                children = obj
+
+            path.append(obj)
+            for child in reversed(children):
+                if isinstance(child, (javalang.ast.Node, list, tuple)):
+                    stack.append((child, depth + 1))
+
+        cogcs += self._binop_cc(sequences)
+        return cogcs, cc
+
+    def _sequence_key(self, path):
+        """Return the line of the element containing a sequence of binary operations as key for the sequence.
+
+        :param tuple path: The ancestors of a BinaryOperation, this is not copied or modified.
+        """
+        # 1. walk back over BinaryOperations in the path until the parent object is reached
+        i = len(path) - 1
+        while type(path[i]) is list or node_type_flags(type(path[i])).binop:
+            i -= 1
+            if node_type_flags(type(path[i])).binop and path[i].operator not in JAVA_SEQUENCE_TYPES:
+                i -= 1
+
+        # 2. use the position of the parent of the BinaryOperation, e.g., if, while as key
+        if not path[i].position:
+            raise Exception('no position for: {}'.format(path[i]))
+        return path[i].position[0]
 
     def _binop_check(self, binop):
-        return type(binop).__name__ == 'BinaryOperation' and binop.operator in JAVA_SEQUENCE_TYPES
+        return node_type_flags(type(binop)).binop and binop.operator in JAVA_SEQUENCE_TYPES
 
-    def _binop_cc(self, method):
+    def _binop_cc(self, sequences):
         """Here we look at sequences of binary operations.
 
         To group them together we first find the position of one binary sequences containing element (if, etc.)
         As we are traversing the tree our first BinaryOperation for a certain containing element will be the middle of all BinaryStatements on the line.
-        From there on we traverse the tree and get the sequence in prefix notation.
+        The sequences contain the nodes below this BinaryOperation in prefix notation, see _method_metrics.
         We then change to infix notation so that we can count the changes in operators that the human would see and count that.
+        The infix notation only consists of the operators, the operands do not matter for the count.
+
+        :param dict sequences: sequence key -> list of nodes in prefix notation
         """
-        tmp = {}
-        sequences = {}
-        for p, n in method:
-            # this hould be the first binop per key
-            if self._binop_check(n):
-                key = self._sequence_key(p)
-                if key not in tmp.keys():
-                    tmp[key] = n
-
-        # this appends the nodes to the list in prefix notation
-        for k, v in tmp.items():
-            sequences[k] = []
-            for p, n in v:
-                sequences[k].append(n)
-
-        # create infix from prefix notation
-        nseq = {}
+        # create infix from prefix notation, we only keep the operators including the prefix operator (!) of each infix part
         for k, v in sequences.items():
             stack = []
             for op in reversed(v):
@@ -467,19 +537,11 @@ class ComplexityJava(object):
                     p = ''
                     if hasattr(op, 'prefix_operators') and op.prefix_operators:
                         p = '!'
-                    stack.append('({} binop:"{}{}" {})'.format(p1, p, op.operator, p2))
+                    stack.append(p1 + [p + op.operator] + p2)
                 else:
-                    stack.append(op)
-            nseq[k] = stack.pop()
-
-        # get the human readable sequence of operators and prefix operator (!)
-        for k, v in nseq.items():
-            tmp = []
-            for m in re.findall(self._binop, v):
-                if m:
-                    tmp.append(m)
-            sequences[k] = tmp
-            self._log.debug('[seq] found sequence {} at pos {}'.format(tmp, k))
+                    stack.append([])
+            sequences[k] = stack.pop()
+            self._log.debug('[seq] found sequence {} at pos {}'.format(sequences[k], k))
 
         # count the changes in sequences via the operators, e.g., a && b || c
         full_cc = 0
@@ -500,22 +562,3 @@ class ComplexityJava(object):
 
             self._log.debug('[seq] cc for sequence {} at {} is {}'.format(v, k, cc))
         return full_cc
-
-    def _nesting(self, method):
-        cc = 0
-        for path, n in method:
-
-            nest = 0  # MethodDeclaration does not count so we can do this here
-            for p in path:
-                if type(p).__name__ in JAVA_NESTING_TYPES:
-                    nest += 1
-                    self._log.debug('[nest] {} in {} increase nesting level to {}'.format(p, 'JAVA_NESTING_TYPES', nest))
-                if type(p) == [] and type(p[0]).__name__ in JAVA_NESTING_TYPES:
-                    nest += 1
-                    self._log.debug('[nest] {} in {} increase nesting level to {}'.format(p[0], 'JAVA_NESTING_TYPES', nest))
-
-            nesting = nest
-            if type(n).__name__ in JAVA_BRANCH_TYPES + ['TryStatement']:
-                cc += 1 + nesting
-                self._log.debug('[nest] {} in {} increase cc to {} including nesting {}'.format(n, 'JAVA_BRANCH_TYPES and Try', cc, nesting))
-        return cc
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""Discovery of the source files of a repository.
+
+The working tree is walked with os.scandir, ignored directories are pruned before they are opened and the extension
+of a file is checked before it is stat'ed. Ignore rules use the gitignore syntax and are compiled once.
+The same rules are used for the paths of a git tree, except that the default build output directories are only pruned in the working tree,
+in a git tree they are tracked source, e.g., a java package named target.
+"""
+
+import os
+import re
+from collections import namedtuple
+
+SOURCE_EXTENSIONS = ('.java', '.py')
+
+# version control metadata, this is never descended into by default
+VCS_DIRS = frozenset(['.git', '.hg', '.svn'])
+
+# dependencies and build output, this is not descended into by default when the working tree is walked
+BUILD_DIRS = frozenset(['node_modules', 'target', 'vendor', '__pycache__'])
+
+PRUNE_DIRS = VCS_DIRS | BUILD_DIRS
+
+IgnoreRule = namedtuple('IgnoreRule', ['pattern', 'regex', 'negate', 'dir_only', 'anchored'])
+
+
+def translate(pattern):
+    """Translate a gitignore glob to a regular expression, * and ? do not match /, ** matches any number of directories.
+
+    :param str pattern: The glob without the negation, the leading and the trailing slash.
+    """
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j == -1:
+                out.append('\\[')
+                i += 1
+            else:
+                chars = pattern[i + 1:j].replace('\\', '\\\\')
+                if chars[0] in '!^':
+                    chars = '^' + chars[1:]
+                out.append('[' + chars + ']')
+                i = j + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return '(?s:' + ''.join(out) + r')\Z'
+
+
+def compile_pattern(line):
+    """Return the IgnoreRule for one line of an ignore file, None for empty lines and comments.
+
+    Patterns without a slash match the name at any depth, other patterns are matched against the whole path relative to the root.
+    A trailing slash only matches directories, a leading ! re-includes what an earlier pattern excluded.
+
+    :param str line: The gitignore-style pattern.
+    """
+    pattern = line.rstrip('\n').rstrip()
+    if not pattern or pattern.startswith('#'):
+        return None
+
+    negate = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith('\\'):
+        pattern = pattern[1:]
+
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    if not pattern:
+        return None
+
+    return IgnoreRule(line, re.compile(translate(pattern)), negate, dir_only, anchored)
+
+
+def load_patterns(filename):
+    """Return the lines of a gitignore-style file.
+
+    :param str filename: The ignore file.
+    """
+    with open(filename, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+class Discovery(object):
+    """Finds the source files below a directory or filters the paths of a git tree."""
+
+    def __init__(self, patterns=(), prune_dirs=None, extensions=SOURCE_EXTENSIONS):
+        """
+        :param list patterns: gitignore-style patterns, later patterns take precedence
+        :param prune_dirs: names of directories which are never descended into, None prunes PRUNE_DIRS in the working tree and only VCS_DIRS in a git tree
+        :param tuple extensions: lower case file extensions of the source files
+        """
+        self.extensions = tuple(extensions)
+        if prune_dirs is None:
+            self.prune_dirs = PRUNE_DIRS
+            self.tracked_prune_dirs = VCS_DIRS
+        else:
+            self.prune_dirs = self.tracked_prune_dirs = frozenset(prune_dirs)
+        self._rules = [rule for rule in (compile_pattern(p) for p in patterns) if rule is not None]
+        self._ignored_dirs = {}  # (directory path, tracked) -> ignored, for the paths of included
+
+    def ignored(self, path, name, is_dir, tracked=False):
+        """Return True if the file or directory is excluded, the parent directories are not checked.
+
+        :param str path: The path relative to the root without leading or trailing slash.
+        :param str name: The last component of the path.
+        :param bool is_dir: The path is a directory.
+        :param bool tracked: The path is from a git tree, not from the working tree.
+        """
+        if is_dir and name in (self.tracked_prune_dirs if tracked else self.prune_dirs):
+            return True
+        for rule in reversed(self._rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(path if rule.anchored else name):
+                return not rule.negate
+        return False
+
+    def walk(self, root):
+        """Yield (filepath, path relative to root, size) for every source file below root.
+
+        Files are yielded before the subdirectories of their directory and both in sorted order, like a sorted os.walk.
+        Symlinks to directories are not followed and unreadable directories are skipped.
+
+        :param str root: The directory to walk.
+        """
+        stack = [(root, '')]
+        while stack:
+            directory, prefix = stack.pop()
+            # os.scandir is only a context manager since python 3.6, the plugin still runs on 3.5
+            try:
+                it = os.scandir(directory)
+            except OSError:
+                continue
+            try:
+                entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            finally:
+                if hasattr(it, 'close'):
+                    it.close()
+
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if not self.ignored(prefix + name, name, True):
+                        subdirs.append((entry.path, prefix + name + '/'))
+
+                # the extension is checked first, most files of a large tree are no source files
+                elif name.lower().endswith(self.extensions) and not self.ignored(prefix + name, name, False):
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        size = 0
+                    yield entry.path, prefix + name, size
+
+            stack.extend(reversed(subdirs))
+
+    def included(self, path, tracked=True):
+        """Return True if the source file is not excluded, e.g., for the paths of git ls-tree.
+
+        :param str path: The path relative to the root with / as separator.
+        :param bool tracked: The path is from a git tree, with False the result is the same as for walk.
+        """
+        if not path.lower().endswith(self.extensions):
+            return False
+        directory, _, name = path.rpartition('/')
+        if directory and self._dir_ignored(directory, tracked):
+            return False
+        return not self.ignored(path, name, False, tracked)
+
+    def _dir_ignored(self, directory, tracked):
+        key = (directory, tracked)
+        if key not in self._ignored_dirs:
+            parent, _, name = directory.rpartition('/')
+            self._ignored_dirs[key] = bool(parent and self._dir_ignored(parent, tracked)) or self.ignored(directory, name, True, tracked)
+        return self._ignored_dirs[key]
+
+
+def create_discovery(patterns=None, ignore_file=None, prune_dirs=None):
+    """Create the Discovery from the command line arguments.
+
+    :param list patterns: gitignore-style patterns or None
+    :param str ignore_file: file with one gitignore-style pattern per line, its patterns come after the other patterns
+    :param str prune_dirs: comma separated directory names which replace the default directories in both modes, an empty string prunes nothing
+    """
+    patterns = list(patterns or [])
+    if ignore_file:
+        patterns += load_patterns(ignore_file)
+    if prune_dirs is None:
+        return Discovery(patterns)
+    return Discovery(patterns, [d.strip() for d in prune_dirs.split(',') if d.strip()])
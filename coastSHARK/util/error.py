@@ -8,3 +8,7 @@ class ParserException(CoastException):
 
 class SyntaxException(CoastException):
     pass
+
+
+class LimitException(CoastException):
+    pass
@@ -2,16 +2,22 @@
 
 """This module contains the AST node types and the classes for extracting them from Java and Python.
 
-The most important classes here are ExtractAstPython and ExtractAstJava.
+The most important classes here are ExtractAstPython and ExtractAstJava, extractor_for returns the right one for a file.
+The parsers (javalang and lib2to3) are only imported when they are needed for the first time so that starting a run stays fast.
 """
 
+import os
+import sys
 import ast
+import timeit
+from array import array
 
-from lib2to3 import refactor, pgen2
-
-import javalang
 from . import error
-from .complexity_java import ComplexityJava
+
+# imported on first use by import_javalang and import_lib2to3
+javalang = None
+refactor = None
+pgen2 = None
 
 # for python
 # https://docs.python.org/3/library/ast.html
@@ -45,17 +51,93 @@ JAVA_NODE_TYPES = [
     'EnumBody', 'EnumConstantDeclaration', 'AnnotationMethod',
 ]
 
+# order of the node types in the count vectors, this is also the order of the fields in schema.json and the csv columns
+NODE_TYPES = PYTHON_NODE_TYPES + [nt for nt in JAVA_NODE_TYPES if nt not in PYTHON_NODE_TYPES]
+
+NODE_TYPE_INDEX = {nt: i for i, nt in enumerate(NODE_TYPES)}
+
+
+def new_type_counts():
+    """Return a count vector with 0 for every node type in NODE_TYPES."""
+    return array('I', [0]) * len(NODE_TYPES)
+
+
+def type_counts_dict(type_counts, node_types):
+    """Return node type -> count for the node types of one language, this is only used for writing the results.
+
+    :param array type_counts: The count vector in the order of NODE_TYPES.
+    :param list node_types: PYTHON_NODE_TYPES or JAVA_NODE_TYPES
+    """
+    return {nt: type_counts[NODE_TYPE_INDEX[nt]] for nt in node_types}
+
+
+def language_node_types(filepath):
+    """Return PYTHON_NODE_TYPES for .py files and JAVA_NODE_TYPES for all other files."""
+    if filepath.lower().endswith('.py'):
+        return PYTHON_NODE_TYPES
+    return JAVA_NODE_TYPES
+
+
+# node class -> index in NODE_TYPES, filled on first use by node_type_index
+_python_type_index = {}
+_java_type_index = {}
+
+
+def node_type_index(node_type, node_types, type_index):
+    """Return the index of the node class in the count vector or None if it is not one of the node types of the language.
+
+    The index is only looked up once per class and then kept in the type_index dict.
+
+    :param type node_type: The class of the node, e.g., ast.Name
+    :param list node_types: PYTHON_NODE_TYPES or JAVA_NODE_TYPES
+    :param dict type_index: _python_type_index or _java_type_index
+    """
+    index = type_index.get(node_type)
+    if index is None and node_type.__name__ in node_types:
+        index = NODE_TYPE_INDEX[node_type.__name__]
+        type_index[node_type] = index
+    return index
+
+
+def decode_source(data):
+    """Decode the raw bytes of a source file the same way we read files, i.e., latin-1 with universal newlines."""
+    return data.decode('latin-1').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def import_javalang():
+    """Import javalang, this is done with the first Java file."""
+    global javalang
+    if javalang is None:
+        import javalang
+
+
+def import_lib2to3():
+    """Import lib2to3, this is done with the first Python file which needs the 2to3 conversion."""
+    global refactor, pgen2
+    if refactor is None:
+        from lib2to3 import refactor, pgen2
+
+
+# the RefactoringTool loads all fixers, we create it only once per process
+_refactoring_tool = None
+
+
+def get_refactoring_tool():
+    """Return the RefactoringTool with all default fixers, it is created on the first call."""
+    global _refactoring_tool
+    if _refactoring_tool is None:
+        import_lib2to3()
+        avail_fixes = set(refactor.get_fixers_from_package("lib2to3.fixes"))
+        _refactoring_tool = refactor.RefactoringTool(avail_fixes)
+    return _refactoring_tool
+
 
 # https://docs.python.org/3/library/2to3.html
 def convert_2to3(file_content, file_name):
     """Quick helper function to convert python2 to python3 so that we can keep the ast buildin."""
 
-    # all default fixers
-    avail_fixes = set(refactor.get_fixers_from_package("lib2to3.fixes"))
-
-    # create default RefactoringTool, apply to passed file_content string and return fixed string
-    rt = refactor.RefactoringTool(avail_fixes)
-    tmp = rt.refactor_string(file_content, file_name)
+    # apply the default RefactoringTool to passed file_content string and return fixed string
+    tmp = get_refactoring_tool().refactor_string(file_content, file_name)
     return str(tmp)
 
 
@@ -100,33 +182,53 @@ class NodePrintVisitor(NodePathVisitor):
 class NodeTypeCountVisitor(ast.NodeVisitor):
     """Used to count imports, node types and nodes for Python."""
 
-    def __init__(self):
-        self.type_counts = {k: 0 for k in PYTHON_NODE_TYPES}  # set 0 for every known type
+    IMPORT = NODE_TYPE_INDEX['Import']
+    IMPORT_FROM = NODE_TYPE_INDEX['ImportFrom']
+
+    def __init__(self, max_nodes=None, filename=None):
+        """
+        :param int max_nodes: Stop with a LimitException as soon as more nodes are visited, None for no limit.
+        :param str filename: The name of the file for the error message.
+        """
+        self.counts = new_type_counts()
         self.imports = []
         self.node_count = 0
+        self._max_nodes = max_nodes if max_nodes is not None else sys.maxsize
+        self._filename = filename
         super().__init__()
 
+    @property
+    def type_counts(self):
+        return type_counts_dict(self.counts, PYTHON_NODE_TYPES)
+
+    def visit(self, node):
+        """Visit a node, we do not have methods for specific node types so we skip the dispatch of ast.NodeVisitor."""
+        self.generic_visit(node)
+
     def generic_visit(self, node):
-        type_name = type(node).__name__
-        self.node_count += 1
-        if type_name in self.type_counts.keys():
-            self.type_counts[type_name] += 1
-        else:
+        index = node_type_index(type(node), PYTHON_NODE_TYPES, _python_type_index)
+        if index is None:
             # if we encounter an unknown node we have to raise an error because then our vector length is not right
-            raise error.CoastException("Unkown NodeType encountered: {}".format(type_name))
+            raise error.CoastException("Unkown NodeType encountered: {}".format(type(node).__name__))
+        self.node_count += 1
+        if self.node_count > self._max_nodes:
+            raise error.LimitException('More than {} AST nodes in file: {}'.format(self._max_nodes, self._filename))
+        self.counts[index] += 1
 
-        if type_name == 'Import':
+        if index == self.IMPORT:
             names = getattr(node, 'names', [])
             for n in names:
                 self.imports.append(n.name)
 
         # from datetime import date -> import datetime.date
-        if type_name == 'ImportFrom':
+        elif index == self.IMPORT_FROM:
             names = getattr(node, 'names', [])
             module = getattr(node, 'module', None)
             for n in names:
                 self.imports.append('{}.{}'.format(module, n.name))
-        super().generic_visit(node)
+
+        for child in ast.iter_child_nodes(node):
+            self.generic_visit(child)
 
 
 class ExtractAstJava:
@@ -135,23 +237,46 @@ class ExtractAstJava:
     Uses the javalang Library.
     """
 
-    def __init__(self, filename):
+    language = 'java'
+
+    def __init__(self, filename, max_nodes=None):
+        """
+        :param str filename: The name of the file.
+        :param int max_nodes: Stop with a LimitException if the AST has more nodes, None for no limit.
+        """
+        self.max_nodes = max_nodes
         self.astdata = None
         self.imports = []
-        self.type_counts = {k: 0 for k in JAVA_NODE_TYPES}  # set 0 for every known type
+        self.package = None
+        self.converted_2to3 = False
+        self.counts = new_type_counts()
         self.node_count = 0
         self.filename = filename
+        self.timings = {}  # phase -> seconds
+
+    @property
+    def type_counts(self):
+        return type_counts_dict(self.counts, JAVA_NODE_TYPES)
 
     def method_metrics(self):
         # new complexity metrics
+        from .complexity_java import ComplexityJava
         cj = ComplexityJava(self.astdata)
         return list(cj.cognitive_complexity())  # we list() here because cognitive_complexity is a generator
 
-    def load(self):
-        """Read the AST."""
+    def load(self, source=None):
+        """Read the AST.
+
+        :param str source: The content of the file, if None the file is read from disk.
+        """
+        import_javalang()
         try:
-            with open(self.filename, 'r', encoding='latin-1') as f:  # latin-1 because we assume no crazy umlaut function names
-                self.astdata = javalang.parse.parse(f.read())
+            if source is None:
+                with open(self.filename, 'r', encoding='latin-1') as f:  # latin-1 because we assume no crazy umlaut function names
+                    source = f.read()
+            start = timeit.default_timer()
+            self.astdata = javalang.parse.parse(source)
+            self.timings['parse'] = timeit.default_timer() - start
         except javalang.parser.JavaSyntaxError:
             err = 'Parser Error in file: {}'.format(self.filename)
             raise error.ParserException(err)
@@ -166,22 +291,30 @@ class ExtractAstJava:
 
         assert self.astdata is not None
 
+        start = timeit.default_timer()
+        counts = self.counts
+        compilation_unit = NODE_TYPE_INDEX['CompilationUnit']
+        max_nodes = self.max_nodes if self.max_nodes is not None else sys.maxsize
         for path, node in self.astdata.walk_tree_iterative():
-            type_name = type(node).__name__
+            index = node_type_index(type(node), JAVA_NODE_TYPES, _java_type_index)
+            if index is None:
+                raise error.CoastException("Unknown NodeType encountered: {}".format(type(node).__name__))
 
             self.node_count += 1
+            counts[index] += 1
+            if self.node_count > max_nodes:
+                raise error.LimitException('More than {} AST nodes in file: {}'.format(max_nodes, self.filename))
 
-            if type_name == 'CompilationUnit':
+            if index == compilation_unit:
+                if node.package is not None:
+                    self.package = node.package.name
                 for imp in getattr(node, 'imports', []):
                     import_line = imp.path
                     if imp.wildcard:
                         import_line += '.*'
                     self.imports.append(import_line)
 
-            if type_name in self.type_counts.keys():
-                self.type_counts[type_name] += 1
-            else:
-                raise error.CoastException("Unknown NodeType encountered: {}".format(type_name))
+        self.timings['node_count'] = timeit.default_timer() - start
 
 
 class ExtractAstPython:
@@ -189,26 +322,55 @@ class ExtractAstPython:
 
     Uses the build in ast and the visitor pattern."""
 
-    def __init__(self, filename):
+    language = 'python'
+
+    def __init__(self, filename, max_nodes=None):
+        """
+        :param str filename: The name of the file.
+        :param int max_nodes: Stop with a LimitException if the AST has more nodes, None for no limit.
+        """
+        self.max_nodes = max_nodes
         self.astdata = None
         self.filename = filename
+        self.package = None
+        self.converted_2to3 = False
+        self.timings = {}  # phase -> seconds
 
-    def load(self):
+    def load(self, source=None):
         """Read the AST.
 
+        Most files are already valid Python 3, only if the ast can not be parsed we run the file through 2to3 and try again.
         We add a \n at the end because 2to3 dies otherwise.
+
+        :param str source: The content of the file, if None the file is read from disk.
         """
         try:
-            with open(self.filename, 'r', encoding='latin-1') as f:
-                self.astdata = ast.parse(source=convert_2to3(f.read() + '\n', self.filename), filename=self.filename)
+            if source is None:
+                with open(self.filename, 'r', encoding='latin-1') as f:
+                    source = f.read()
+            start = timeit.default_timer()
+            try:
+                self.astdata = ast.parse(source=source, filename=self.filename)
+            except SyntaxError:
+                self.converted_2to3 = True
+                convert_start = timeit.default_timer()
+                import_lib2to3()
+                try:
+                    source = convert_2to3(source + '\n', self.filename)
+                except pgen2.parse.ParseError as e:
+                    err = 'Parser Error in file: {}, error: {}'.format(self.filename, e)
+                    raise error.ParserException(err)
+                self.timings['2to3'] = timeit.default_timer() - convert_start
+                self.astdata = ast.parse(source=source, filename=self.filename)
+            self.timings['parse'] = timeit.default_timer() - start - self.timings.get('2to3', 0)
 
             assert self.astdata is not None
 
-            self.nt = NodeTypeCountVisitor()
+            start = timeit.default_timer()
+            # the builtin ast is complete at this point, the visitor stops at the limit before the rest is counted
+            self.nt = NodeTypeCountVisitor(self.max_nodes, self.filename)
             self.nt.visit(self.astdata)
-        except pgen2.parse.ParseError as e:
-            err = 'Parser Error in file: {}, error: {}'.format(self.filename, e)
-            raise error.ParserException(err)
+            self.timings['node_count'] = timeit.default_timer() - start
         except SyntaxError as e:
             err = 'Syntax Error in file: {}, error: {}'.format(self.filename, e)
             raise error.SyntaxException(err)
@@ -217,6 +379,10 @@ class ExtractAstPython:
     def imports(self):
         return self.nt.imports
 
+    @property
+    def counts(self):
+        return self.nt.counts
+
     @property
     def type_counts(self):
         return self.nt.type_counts
@@ -224,3 +390,29 @@ class ExtractAstPython:
     @property
     def node_count(self):
         return self.nt.node_count
+
+
+# file extension -> extractor class, the parser of a language is imported when the first file of the language is loaded
+EXTRACTORS = {
+    '.py': ExtractAstPython,
+    '.java': ExtractAstJava,
+}
+
+
+def register_extractor(extension, extractor):
+    """Register the extractor class for files with this extension.
+
+    :param str extension: The lower case file extension including the dot, e.g., .java
+    :param type extractor: The class, it is created with the file name and max_nodes and has to provide the same attributes as ExtractAstJava.
+    """
+    EXTRACTORS[extension] = extractor
+
+
+def extractor_for(filepath, max_nodes=None):
+    """Return a new extractor for the file, files with an unknown extension are treated as Java files.
+
+    :param str filepath: The path of the file.
+    :param int max_nodes: Maximum number of AST nodes, None for no limit.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    return EXTRACTORS.get(extension, ExtractAstJava)(filepath, max_nodes)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Read source files of a revision straight from the git object database.
+
+This avoids copying the repository and checking out every revision into a working tree.
+"""
+
+import os
+import logging
+import subprocess
+
+from . import error
+
+
+class GitRepository(object):
+    """Lists and reads blobs of a git repository.
+
+    The blob contents are streamed through one long-lived git cat-file --batch process.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the git repository (working tree or bare).
+        """
+        self.path = path
+        self._cat_file = None
+        self._log = logging.getLogger('coastSHARK')
+
+    def _git(self, *args):
+        return subprocess.check_output(['git', '-C', self.path] + list(args))
+
+    def rev_list(self, revision_range):
+        """Return the revision hashes of a range, e.g., A..B, oldest first.
+
+        :param str revision_range: The range of revisions as understood by git rev-list.
+        """
+        return self._git('rev-list', '--reverse', revision_range).decode('ascii').split()
+
+    def ls_tree(self, revision, extensions=('.java', '.py'), sizes=False):
+        """Yield (blob hash, path) for every file of the revision with one of the given extensions.
+
+        Symlinks and submodules are ignored, the paths are relative to the root of the repository.
+
+        :param str revision: The revision hash.
+        :param tuple extensions: Lower case file extensions to include.
+        :param bool sizes: Yield (blob hash, path, size in bytes) instead.
+        """
+        out = self._git('ls-tree', '-r', '-z', '-l', '--full-tree', revision)
+        for entry in out.split(b'\0'):
+            if not entry:
+                continue
+            meta, path = entry.split(b'\t', 1)
+            mode, object_type, blob, size = meta.split()
+
+            # 120000 are symlinks, commit objects are submodules
+            if object_type != b'blob' or mode == b'120000':
+                continue
+
+            path = os.fsdecode(path)
+            if path.lower().endswith(extensions):
+                if sizes:
+                    yield blob.decode('ascii'), path, int(size)
+                else:
+                    yield blob.decode('ascii'), path
+
+    def read(self, blob):
+        """Return the raw content of the blob.
+
+        :param str blob: The blob hash.
+        """
+        if self._cat_file is None:
+            self._cat_file = subprocess.Popen(['git', '-C', self.path, 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+        self._cat_file.stdin.write(blob.encode('ascii') + b'\n')
+        self._cat_file.stdin.flush()
+
+        # <sha> <type> <size>\n<content>\n or <sha> missing\n
+        header = self._cat_file.stdout.readline().split()
+        if len(header) != 3:
+            raise error.CoastException('git cat-file could not read blob {} in {}'.format(blob, self.path))
+
+        data = self._cat_file.stdout.read(int(header[2]))
+        self._cat_file.stdout.read(1)
+        return data
+
+    def close(self):
+        """Stop the git cat-file process."""
+        if self._cat_file is not None:
+            self._cat_file.stdin.close()
+            self._cat_file.wait()
+            self._cat_file.stdout.close()
+            self._cat_file = None
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+
+"""This module distributes the AST extraction of single files to a pool of worker processes.
+
+The workers only return plain picklable records (dicts), writing the results is left to the calling process.
+The largest files are handed to the workers first so that no worker is left with a huge file at the end, a worker which
+exceeds the timeout for a file is killed and replaced. The records are still returned in the order of the files.
+"""
+
+import os
+import logging
+import timeit
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import namedtuple, deque
+
+from . import error
+from .extract_ast import extractor_for, decode_source
+from .cache import ResultCache, blob_hash
+from .timing import timings
+from .skip_log import SkipLog
+from .discovery import Discovery
+
+# these errors are not critical, we can still do the other files
+SKIP_EXCEPTIONS = (error.ParserException, error.LimitException, TabError, IndentationError)
+
+# seconds between the checks of the memory of the workers
+RSS_INTERVAL = 0.5
+
+# new workers are started while the writer and pymongo threads run, a plain fork could inherit one of their locks in a locked state
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# a file to extract, data and blob are only known beforehand if we read from the git objects, size is the number of bytes
+SourceFile = namedtuple('SourceFile', ['filepath', 'path', 'data', 'blob', 'size'])
+
+# configuration of the current (worker) process, see init_worker
+_method_metrics = False
+_cache = None
+_max_nodes = None
+
+
+def find_source_files(input_path, discovery=None):
+    """Yield a SourceFile for every source file below input_path which is not ignored.
+
+    Directories and files are visited in sorted order so that the output is deterministic.
+
+    :param str input_path: The path to the checked out repository.
+    :param Discovery discovery: The ignore rules, None only prunes the default directories.
+    """
+    if discovery is None:
+        discovery = Discovery()
+    for filepath, path, size in discovery.walk(input_path):
+        yield SourceFile(filepath, path, None, None, size)  # use relative path to find File Document in mongodb
+
+
+def read_blob(repository, blob):
+    """Return the content of the blob, the time is added to the read phase."""
+    with timings.measure('read'):
+        return repository.read(blob)
+
+
+def extract_revision(extractor, repository, revision, previous, discovery=None):
+    """Yield the records for all files of a revision in the order of the git tree.
+
+    Files with the same blob hash as in the previous revision are neither read nor parsed again, their previous record is yielded instead.
+
+    :param Extractor extractor: The extractor used for the changed files.
+    :param GitRepository repository: The repository to read from.
+    :param str revision: The revision hash.
+    :param dict previous: path -> record of the previously analyzed revision, this is updated to the current revision when all records are consumed
+    :param Discovery discovery: The ignore rules, None only prunes the default directories.
+    """
+    if discovery is None:
+        discovery = Discovery()
+    tree = [(blob, path, size) for blob, path, size in repository.ls_tree(revision, discovery.extensions, sizes=True) if discovery.included(path)]
+    changed = [(blob, path, size) for blob, path, size in tree if path not in previous.keys() or previous[path]['blob'] != blob]
+
+    # the contents are read when the extractor hands the file to a worker
+    records = extractor.extract((SourceFile(path, path, None, blob, size) for blob, path, size in changed), lambda f: read_blob(repository, f.blob))
+
+    current = {}
+    for blob, path, _ in tree:
+        if path in previous.keys() and previous[path]['blob'] == blob:
+            record = previous[path]
+        else:
+            record = next(records)
+        current[path] = record
+        yield record
+
+    logging.getLogger('coastSHARK').info('revision {}: {} files, {} changed'.format(revision, len(tree), len(changed)))
+    previous.clear()
+    previous.update(current)
+
+
+def init_worker(method_metrics=False, cache_dir=None, max_nodes=None, cache=None):
+    """Configure extract_file for the current process.
+
+    :param bool method_metrics: also collect method metrics for java files
+    :param str cache_dir: directory of the result cache, None disables the cache
+    :param int max_nodes: files with more AST nodes are skipped, None for no limit
+    :param ResultCache cache: an already open result cache which is used instead of cache_dir, it is not closed here
+    """
+    global _method_metrics, _cache, _max_nodes
+    _method_metrics = method_metrics
+    _cache = cache if cache is not None else ResultCache(cache_dir) if cache_dir else None
+    _max_nodes = max_nodes
+
+
+def new_record(job, skipped=None, skip_reason=None):
+    """Return the record of a file without any extracted data.
+
+    :param SourceFile job: The file.
+    :param str skipped: The message why the file is skipped.
+    :param str skip_reason: The reason why the file is skipped, one of skip_log.REASONS.
+    """
+    return {'path': job.path, 'imports': [], 'node_count': 0, 'type_counts': None, 'method_metrics': None, 'package': None, 'converted_2to3': False, 'skipped': skipped,
+            'skip_reason': skip_reason, 'blob': job.blob, 'cached': False, 'size': job.size or 0, 'timings': {}}
+
+
+def check_size(job, max_file_size):
+    """Return the skipped record if the file is larger than max_file_size bytes, None otherwise.
+
+    This is checked before the file is read.
+
+    :param SourceFile job: The file.
+    :param int max_file_size: The maximum size in bytes, None for no limit.
+    """
+    if max_file_size is not None and job.size is not None and job.size > max_file_size:
+        return new_record(job, 'File too large ({} > {} bytes): {}'.format(job.size, max_file_size, job.path), 'too_large')
+    return None
+
+
+def process_rss(pid):
+    """Return the resident set size of the process in bytes, None if it is not known (no /proc)."""
+    try:
+        with open('/proc/{}/statm'.format(pid), 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def extract_file(job):
+    """Extract imports, node type counts and optionally method metrics from one file.
+
+    This is run inside the worker processes, therefore it only takes and returns plain data.
+    If the result cache is enabled and contains the blob hash of the file, parsing is skipped.
+
+    :param SourceFile job: The file to extract, the content is read from the filepath if it is not given.
+    :return: dict with the extracted data, type_counts is the count vector in the order of NODE_TYPES, skipped contains the error message if the file could not be parsed,
+             timings contains the seconds per phase and size the bytes of the file
+    """
+    filepath, path, data, blob, _ = job
+    record = new_record(job)
+
+    if data is None:
+        start = timeit.default_timer()
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        read_time = timeit.default_timer() - start
+    else:
+        read_time = None
+    record['size'] = len(data)
+
+    if _cache is not None:
+        if blob is None:
+            record['blob'] = blob_hash(data)
+        cached = _cache.get(record['blob'], _method_metrics)
+        if cached is not None:
+            record.update(cached)
+            record['cached'] = True
+            if not _method_metrics:
+                record['method_metrics'] = None
+            if _max_nodes is not None and record['node_count'] > _max_nodes:
+                return new_record(job._replace(size=record['size']), 'More than {} AST nodes in file: {}'.format(_max_nodes, filepath), 'too_many_nodes')
+            return record
+
+    try:
+        e = extractor_for(filepath, _max_nodes)
+        record['timings'] = e.timings  # the extractor adds the phases while it loads the file
+        e.load(decode_source(data))
+        record['converted_2to3'] = e.converted_2to3
+        record['package'] = e.package
+
+        if _method_metrics and e.language == 'java':
+            start = timeit.default_timer()
+            record['method_metrics'] = e.method_metrics()
+            e.timings['method_metrics'] = timeit.default_timer() - start
+
+        record['imports'] = e.imports
+        record['node_count'] = e.node_count
+        record['type_counts'] = e.counts
+
+    except SKIP_EXCEPTIONS as err:
+        record['skipped'] = str(err)
+        record['skip_reason'] = 'too_many_nodes' if isinstance(err, error.LimitException) else 'parse_error'
+
+    # the memory of the process is freed again with the AST of the file
+    except MemoryError:
+        record['skipped'] = 'Out of memory in file: {}'.format(filepath)
+        record['skip_reason'] = 'memory'
+
+    if read_time is not None:
+        record['timings']['read'] = read_time
+    return record
+
+
+def with_data(job, read):
+    """Return the SourceFile with the content from read if it has no data yet and read is given."""
+    if job.data is None and read is not None:
+        return job._replace(data=read(job))
+    return job
+
+
+def run_worker(conn, method_metrics=False, cache_dir=None, max_nodes=None):
+    """Main function of a worker process, extracts the files received over the connection until it receives None.
+
+    The worker sends (record, None) back or (None, exception) for critical errors.
+    """
+    init_worker(method_metrics, cache_dir, max_nodes)
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        try:
+            conn.send((extract_file(job), None))
+        except Exception as e:
+            conn.send((None, e))
+
+
+class Worker(object):
+    """One worker process with the connection to it and the file it is working on."""
+
+    def __init__(self, method_metrics=False, cache_dir=None, max_nodes=None):
+        context = multiprocessing.get_context(START_METHOD)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(child_conn, method_metrics, cache_dir, max_nodes), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.index = None
+        self.deadline = None
+
+    def kill(self):
+        """Kill the process, e.g., because it is stuck in a file."""
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        """Let the process finish, it is killed if it does not stop within a few seconds."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool(object):
+    """Worker processes which extract one file at a time.
+
+    The files are handed out largest first. A worker which needs longer than the timeout for one file, which uses more memory than
+    max_rss or which dies, e.g., because of the OOM killer, is replaced by a new worker and the file is recorded as skipped.
+    """
+
+    def __init__(self, workers, method_metrics=False, cache_dir=None, timeout=None, max_file_size=None, max_nodes=None, max_rss=None):
+        """
+        :param int workers: number of worker processes
+        :param bool method_metrics: also collect method metrics for java files
+        :param str cache_dir: directory of the result cache, None disables the cache
+        :param float timeout: seconds a worker may spend on one file, None waits forever
+        :param int max_file_size: larger files (in bytes) are skipped without reading them, None for no limit
+        :param int max_nodes: files with more AST nodes are skipped, None for no limit
+        :param int max_rss: resident memory of a worker in bytes, None for no limit
+        """
+        self._worker_args = (method_metrics, cache_dir, max_nodes)
+        self._timeout = timeout
+        self._max_file_size = max_file_size
+        self._max_rss = max_rss
+        self._log = logging.getLogger('coastSHARK')
+        self._workers = [Worker(*self._worker_args) for _ in range(workers)]
+
+    def _replace(self, worker):
+        worker.kill()
+        new = Worker(*self._worker_args)
+        self._workers[self._workers.index(worker)] = new
+        return new
+
+    def _send(self, worker, job):
+        """Send the job to the worker, a worker which died or was killed while it was idle is replaced first."""
+        try:
+            worker.conn.send(job)
+        except OSError:
+            worker = self._replace(worker)
+            worker.conn.send(job)
+        return worker
+
+    def _rss_exceeded(self, worker):
+        rss = process_rss(worker.process.pid)
+        return rss is not None and rss > self._max_rss
+
+    def run(self, files, read=None):
+        """Extract the files, largest first, and yield (index, record) in the order in which the files are done.
+
+        :param list files: SourceFile for every file, the size is used for the order.
+        :param callable read: Returns the content for a SourceFile without data, it is called right before the file is handed to a worker.
+        """
+        pending = deque(sorted(range(len(files)), key=lambda i: files[i].size or 0, reverse=True))
+        idle = list(self._workers)
+        busy = {}  # connection -> worker
+
+        try:
+            while pending or busy:
+                while pending and idle:
+                    index = pending.popleft()
+                    record = check_size(files[index], self._max_file_size)
+                    if record is not None:
+                        yield index, record
+                        continue
+
+                    worker = self._send(idle.pop(), with_data(files[index], read))
+                    worker.index = index
+                    worker.deadline = timeit.default_timer() + self._timeout if self._timeout else None
+                    busy[worker.conn] = worker
+
+                if not busy:
+                    continue
+
+                wakeups = [w.deadline for w in busy.values() if w.deadline is not None]
+                if self._max_rss:
+                    wakeups.append(timeit.default_timer() + RSS_INTERVAL)
+                wait_time = max(0, min(wakeups) - timeit.default_timer()) if wakeups else None
+
+                for conn in wait(list(busy.keys()), wait_time):
+                    worker = busy.pop(conn)
+                    try:
+                        record, err = conn.recv()
+                    except EOFError:
+                        self._log.error('worker died while extracting {}, exit code {}'.format(files[worker.index].path, worker.process.exitcode))
+                        yield worker.index, new_record(files[worker.index], 'Worker died while extracting file: {}'.format(files[worker.index].path), 'worker_died')
+                        idle.append(self._replace(worker))
+                        continue
+
+                    if err is not None:
+                        raise err
+
+                    # python does not always give the memory of a large AST back, such a worker is replaced
+                    index = worker.index
+                    if self._max_rss and self._rss_exceeded(worker):
+                        worker = self._replace(worker)
+                    idle.append(worker)
+                    yield index, record
+
+                now = timeit.default_timer()
+                for worker in list(busy.values()):
+                    if worker.deadline is not None and worker.deadline <= now:
+                        self._log.error('timeout after {}s in {}, replacing the worker'.format(self._timeout, files[worker.index].path))
+                        record = new_record(files[worker.index], 'Timeout after {}s in file: {}'.format(self._timeout, files[worker.index].path), 'timeout')
+                    elif self._max_rss and self._rss_exceeded(worker):
+                        self._log.error('worker uses more than {} bytes of memory in {}, replacing the worker'.format(self._max_rss, files[worker.index].path))
+                        record = new_record(files[worker.index], 'Memory limit of {} bytes exceeded in file: {}'.format(self._max_rss, files[worker.index].path), 'memory')
+                    else:
+                        continue
+
+                    del busy[worker.conn]
+                    index = worker.index
+                    idle.append(self._replace(worker))
+                    yield index, record
+
+        # if the caller stops early the busy workers are still working on files we do not need anymore,
+        # they are replaced by _send if the pool is used again
+        finally:
+            for worker in busy.values():
+                worker.kill()
+
+    def close(self):
+        """Stop all worker processes."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+
+class Extractor(object):
+    """Extracts files with an optional pool of worker processes and the result cache.
+
+    The pool and the cache are kept open for the whole run, e.g., for analyzing multiple revisions.
+    Skipped files are counted by reason in the skip_log.
+    """
+
+    def __init__(self, workers=1, method_metrics=False, cache_dir=None, timeout=None, max_file_size=None, max_nodes=None, max_rss=None, skip_log=None):
+        """
+        :param int workers: number of worker processes, 1 parses in the current process unless there is a timeout or max_rss
+        :param bool method_metrics: also collect method metrics for java files
+        :param str cache_dir: directory of the result cache, None disables the cache
+        :param float timeout: seconds a worker may spend on one file, None waits forever
+        :param int max_file_size: larger files (in bytes) are skipped without reading them, None for no limit
+        :param int max_nodes: files with more AST nodes are skipped, None for no limit
+        :param int max_rss: resident memory of a worker in bytes, None for no limit
+        :param SkipLog skip_log: gets every skipped file, None only counts them
+        """
+        self._log = logging.getLogger('coastSHARK')
+        self._pool = None
+        self._cache = None
+        self._max_file_size = max_file_size
+        self.skip_log = skip_log if skip_log is not None else SkipLog()
+        self.hits = 0
+        self.misses = 0
+        self.converted_2to3 = 0
+
+        # new results are only written by this process, without workers extract_file reads from the same cache
+        if cache_dir:
+            self._cache = ResultCache(cache_dir)
+
+        # a file can only be stopped after the timeout or at the memory limit if it runs in a process we can kill
+        if workers <= 1 and not timeout and not max_rss:
+            init_worker(method_metrics, max_nodes=max_nodes, cache=self._cache)
+        else:
+            self._log.info('parsing files with {} worker processes'.format(max(workers, 1)))
+            self._pool = WorkerPool(max(workers, 1), method_metrics, cache_dir, timeout, max_file_size, max_nodes, max_rss)
+
+    def _extract(self, job, read):
+        record = check_size(job, self._max_file_size)
+        if record is None:
+            record = extract_file(with_data(job, read))
+        return record
+
+    def extract(self, files, read=None):
+        """Extract all files and yield the records in the order of the files.
+
+        With worker processes the files are collected first so that the largest files can be started first,
+        finished records are held back until all records of the files before them are done.
+        Critical exceptions of the workers are raised here.
+
+        :param files: iterable of SourceFile, e.g., from find_source_files, see extract_revision for the files of a git revision
+        :param callable read: Returns the content for a SourceFile without data, e.g., from the git objects.
+        """
+        if self._pool is None:
+            records = enumerate(self._extract(job, read) for job in files)
+        else:
+            records = self._pool.run(list(files), read)
+
+        done = {}
+        next_index = 0
+        for index, record in records:
+            done[index] = record
+            while next_index in done:
+                record = done.pop(next_index)
+                next_index += 1
+
+                self._log.debug('parsed file: {}'.format(record['path']))
+                if record['skipped']:
+                    self.skip_log.add(record)
+                if record['converted_2to3']:
+                    self.converted_2to3 += 1
+                if not record['cached']:
+                    timings.add_file(record['path'], record['size'], record['timings'])
+                if self._cache is not None:
+                    if record['cached']:
+                        self.hits += 1
+                    elif not record['skipped']:
+                        self.misses += 1
+                        self._cache.put(record['blob'], record)
+                yield record
+
+    def close(self):
+        """Stop the worker processes, write the result cache and close the skip log."""
+        self._log.info('{} python files needed the 2to3 conversion'.format(self.converted_2to3))
+        self.skip_log.log_summary()
+        self.skip_log.close()
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        else:
+            init_worker()
+
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+            self._log.info('result cache: {} hits, {} misses'.format(self.hits, self.misses))
+
+
+def extract_files(files, workers=1, method_metrics=False, cache_dir=None, timeout=None, max_file_size=None, max_nodes=None, max_rss=None, skip_log=None):
+    """Extract all files and yield the records in the order of the files, see Extractor.
+
+    :param files: iterable of SourceFile, e.g., from find_source_files, see extract_revision for the files of a git revision
+    :param int workers: number of worker processes, 1 parses in the current process unless there is a timeout or max_rss
+    :param bool method_metrics: also collect method metrics for java files
+    :param str cache_dir: directory of the result cache, None disables the cache
+    :param float timeout: seconds a worker may spend on one file, None waits forever
+    :param int max_file_size: larger files (in bytes) are skipped without reading them, None for no limit
+    :param int max_nodes: files with more AST nodes are skipped, None for no limit
+    :param int max_rss: resident memory of a worker in bytes, None for no limit
+    :param SkipLog skip_log: gets every skipped file, None only counts them
+    """
+    extractor = Extractor(workers, method_metrics, cache_dir, timeout, max_file_size, max_nodes, max_rss, skip_log)
+    try:
+        yield from extractor.extract(files)
+    finally:
+        extractor.close()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+"""Server mode, a long running process which analyzes revisions sent as JSON jobs over a Unix domain socket.
+
+The worker processes, the result cache and the MongoDB connection are kept for all jobs, together with the Project, VCSSystem and
+file index of every repository. This saves starting a new interpreter, connecting and warming up the caches for every revision.
+
+The client sends one job as JSON object in one line, the server answers with one JSON object per line, each with an event:
+started, progress (every progress_interval files of a revision) and at the end done or error.
+A job contains input (path to the repository), repository_url, project_name and either revision, revisions (a list) or revision_range.
+With git_revision the files are read from the git objects instead of the working tree, this is implied by revisions and revision_range.
+The job {"command": "stop"} stops the server. Jobs run one after another in the order in which the clients connect.
+The timing summary is logged (and optionally written) after every job and the timings are cleared, they would grow with every job otherwise.
+"""
+
+import os
+import json
+import stat
+import socket
+import logging
+import timeit
+
+from . import error
+from .analyze import check_input, analyze
+from .git_repository import GitRepository
+from .write_mongo import MongoDb
+from .timing import timings
+
+# events which end the answer to a job
+FINAL_EVENTS = ('done', 'error', 'stopped')
+
+
+def write_message(f, message):
+    """Write one message as JSON line to the binary file object of a socket."""
+    f.write(json.dumps(message).encode('utf-8') + b'\n')
+    f.flush()
+
+
+def read_message(f):
+    """Read one JSON line from the binary file object of a socket, None if the connection is closed."""
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def send_job(socket_path, job):
+    """Send a job to the server and yield the messages of the server until the job is done.
+
+    :param str socket_path: Path of the Unix domain socket of the server.
+    :param dict job: The job, see the module documentation.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        with s.makefile('rwb') as f:
+            write_message(f, job)
+            while True:
+                message = read_message(f)
+                if message is None:
+                    raise error.CoastException('the server closed the connection before the job was done')
+                yield message
+                if message['event'] in FINAL_EVENTS:
+                    return
+
+
+class JobServer(object):
+    """Accepts jobs on a Unix domain socket and runs them with one Extractor."""
+
+    def __init__(self, socket_path, extractor, db, queue_size=1000, progress_interval=1000, discovery=None, timing_report=None):
+        """
+        :param str socket_path: Path of the Unix domain socket, a stale socket file is replaced.
+        :param Extractor extractor: Used for all jobs, it is closed with the server.
+        :param dict db: The connection arguments of MongoDb, i.e., database, user, password, host, port, authentication and ssl.
+        :param int queue_size: Number of records which may wait for the MongoDB writer thread.
+        :param int progress_interval: Send a progress message every this many files of a revision.
+        :param Discovery discovery: The ignore rules for all jobs, None only prunes the default directories.
+        :param str timing_report: Write the timings of every job as JSON to this file with the job number before the extension, e.g., timing.3.json.
+        """
+        self.socket_path = socket_path
+        self.jobs = 0
+        self._extractor = extractor
+        self._db = db
+        self._queue_size = queue_size
+        self._progress_interval = progress_interval
+        self._discovery = discovery
+        self._timing_report = timing_report
+        self._mongo = {}  # (project_name, repository_url) -> connected MongoDb
+        self._socket = None
+        self._stopped = False
+        self._log = logging.getLogger('coastSHARK')
+
+    def serve_forever(self):
+        """Run jobs until the stop command is received, the server is closed afterwards."""
+        if os.path.exists(self.socket_path):
+            self._remove_stale_socket()
+
+        # only the user of the server may connect, the jobs run with its MongoDB credentials
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            s.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        s.listen(16)
+        self._socket = s
+        self._log.info('listening on {}'.format(self.socket_path))
+
+        try:
+            while not self._stopped:
+                conn, _ = self._socket.accept()
+                with conn, conn.makefile('rwb') as f:
+                    self.handle(f)
+        finally:
+            self.close()
+
+    def _remove_stale_socket(self):
+        """Remove the socket file of a server which did not shut down cleanly, raise if it is not a socket or a server is still listening."""
+        if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+            raise error.CoastException('{} exists and is not a socket'.format(self.socket_path))
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(self.socket_path)
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+                return
+        raise error.CoastException('a server is already listening on {}'.format(self.socket_path))
+
+    def handle(self, f):
+        """Read one job from the connection, run it and send the messages back.
+
+        Errors of a job are sent to the client, the server keeps running.
+        If the client goes away the job is still finished so that the revision is completely written.
+        """
+        connected = True
+
+        def send(message):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                write_message(f, message)
+            except OSError:
+                self._log.warning('client closed the connection, the job is finished without it')
+                connected = False
+
+        try:
+            job = read_message(f)
+        except ValueError as e:
+            send({'event': 'error', 'message': 'invalid job: {}'.format(e)})
+            return
+        if job is None:
+            return
+
+        if job.get('command') == 'stop':
+            self._log.info('stop command received')
+            self._stopped = True
+            send({'event': 'stopped', 'jobs': self.jobs})
+            return
+
+        try:
+            result = self.run_job(job, send)
+            result['event'] = 'done'
+        except Exception as e:
+            self._log.exception(e)
+            result = {'event': 'error', 'message': str(e)}
+
+        # the timings are done before the client gets the answer
+        self._write_timings()
+        send(result)
+
+    def _write_timings(self):
+        """Log and write the timings of the last job and clear them for the next job."""
+        timings.log_summary()
+        if self._timing_report:
+            base, ext = os.path.splitext(self._timing_report)
+            try:
+                timings.write_report('{}.{}{}'.format(base, self.jobs, ext))
+            except OSError as e:
+                self._log.error('could not write the timing report: {}'.format(e))
+        timings.reset()
+
+    def run_job(self, job, send):
+        """Analyze the revisions of the job and write them to the MongoDB.
+
+        The connected MongoDb of a repository, with its Project, VCSSystem and file index, is kept for the following jobs
+        of the same repository, they only switch the revision. It is dropped if a job fails.
+
+        :param dict job: The job, see the module documentation.
+        :param callable send: Sends a message to the client.
+        :return: dict with the number of revisions, files and seconds
+        """
+        start = timeit.default_timer()
+        self.jobs += 1
+
+        if not job.get('input') or not job.get('repository_url'):
+            raise error.CoastException('a job needs input and repository_url')
+        if len([r for r in ('revision', 'revisions', 'revision_range') if job.get(r)]) != 1:
+            raise error.CoastException('a job needs exactly one of revision, revisions or revision_range')
+        input_path = check_input(job['input'])
+
+        repository = None
+        if job.get('git_revision') or job.get('revisions') or job.get('revision_range'):
+            repository = GitRepository(input_path)
+
+        try:
+            if job.get('revision_range'):
+                revisions = repository.rev_list(job['revision_range'])
+            else:
+                revisions = job.get('revisions') or [job['revision']]
+            if not revisions:
+                raise error.CoastException('no revisions to analyze')
+
+            send({'event': 'started', 'job': self.jobs, 'revisions': len(revisions)})
+
+            key = (job.get('project_name'), job['repository_url'])
+            m = self._connect(key, revisions[0])
+
+            def progress(revision, files):
+                if files % self._progress_interval == 0:
+                    send({'event': 'progress', 'revision': revision, 'files': files})
+
+            try:
+                files = analyze(m, self._extractor, input_path, revisions, repository, self._queue_size, progress, self._discovery)
+            except Exception:
+                self._mongo.pop(key, None)
+                raise
+            finally:
+                m.flush()
+
+        finally:
+            if repository is not None:
+                repository.close()
+
+        seconds = timeit.default_timer() - start
+        self._log.info('job {}: {} revision(s) with {} files of {} in {:.5f}s'.format(self.jobs, len(revisions), files, job['repository_url'], seconds))
+        return {'revisions': len(revisions), 'files': files, 'seconds': seconds}
+
+    def _connect(self, key, revision):
+        """Return the connected MongoDb for (project_name, repository_url), switched to the revision."""
+        m = self._mongo.get(key)
+        if m is None:
+            m = MongoDb(project_name=key[0], vcs_url=key[1], revision=revision, **self._db)
+            m.connect()
+            self._mongo[key] = m
+        elif m.revision != revision:
+            m.set_revision(revision)
+        return m
+
+    def close(self):
+        """Stop listening, remove the socket file and close the extractor."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._extractor.close()
+            self._mongo.clear()
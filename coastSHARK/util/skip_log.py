@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""Accounting of the skipped files.
+
+Every skipped file is counted by its reason and optionally written as one JSON line as soon as it is known,
+so the log is complete up to the last file even if the run is stopped.
+"""
+
+import json
+import logging
+from collections import Counter
+
+# skip_reason of the records
+REASONS = ['parse_error', 'too_large', 'too_many_nodes', 'memory', 'timeout', 'worker_died']
+
+
+class SkipLog(object):
+    """Counts the skipped files by reason and writes them to a JSON lines file."""
+
+    def __init__(self, filename=None):
+        """
+        :param str filename: The JSON lines file, None only counts the skipped files.
+        """
+        self.reasons = Counter()
+        self._f = open(filename, 'a', encoding='utf-8') if filename else None
+
+    def add(self, record):
+        """Add a skipped file.
+
+        :param dict record: The record of the file, see extract_file.
+        """
+        self.reasons[record['skip_reason']] += 1
+        if self._f is not None:
+            self._f.write(json.dumps({'path': record['path'], 'reason': record['skip_reason'], 'message': record['skipped'], 'size': record['size'], 'blob': record['blob']}))
+            self._f.write('\n')
+            self._f.flush()
+
+    def log_summary(self):
+        """Log the number of skipped files per reason."""
+        if self.reasons:
+            reasons = ', '.join('{} {}'.format(reason, count) for reason, count in sorted(self.reasons.items()))
+            logging.getLogger('coastSHARK').info('skipped {} files: {}'.format(sum(self.reasons.values()), reasons))
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Timing instrumentation for the phases of the extraction.
+
+The phases of one file (read, 2to3, parse, node counting and method metrics) are measured where the file is extracted, possibly in a worker process,
+and travel back with the record. Phases of the main process, e.g., reading from git or the MongoDB, are added directly to the timings.
+At the end a summary with totals, percentiles and the slowest files is logged and optionally written as JSON report.
+"""
+
+import json
+import logging
+import threading
+import timeit
+from contextlib import contextmanager
+
+PHASES = ['read', '2to3', 'parse', 'node_count', 'method_metrics', 'mongo_lookup', 'mongo_write']
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(values, p):
+    """Return the p-th percentile (nearest rank) of the sorted values, 0 for no values.
+
+    :param list values: Sorted list of numbers.
+    :param int p: The percentile between 0 and 100.
+    """
+    if not values:
+        return 0
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+class Timings(object):
+    """Collects the durations per phase and per file, this is used by the main process and the MongoDB writer thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {p: [] for p in PHASES}
+        self.files = []  # (path, bytes, seconds, {phase: seconds})
+
+    def add(self, phase, seconds):
+        """Add the duration of one phase that does not belong to a single file.
+
+        :param str phase: One of PHASES.
+        :param float seconds: The duration.
+        """
+        with self._lock:
+            self.phases[phase].append(seconds)
+
+    @contextmanager
+    def measure(self, phase):
+        """Add the duration of the with block to the phase."""
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self.add(phase, timeit.default_timer() - start)
+
+    def add_file(self, path, size, phases):
+        """Add the durations of the phases of one extracted file.
+
+        :param str path: The path of the file.
+        :param int size: The size of the file in bytes.
+        :param dict phases: phase -> seconds
+        """
+        with self._lock:
+            self.files.append((path, size, sum(phases.values()), phases))
+            for phase, seconds in phases.items():
+                self.phases[phase].append(seconds)
+
+    def reset(self):
+        """Remove all durations, e.g., after the summary of a job of the server was written."""
+        with self._lock:
+            self.phases = {p: [] for p in PHASES}
+            self.files = []
+
+    def summary(self, top=10):
+        """Return totals and percentiles per phase and the slowest files as dict.
+
+        :param int top: Number of slowest files to include.
+        """
+        with self._lock:
+            phases = {}
+            for phase in PHASES:
+                values = sorted(self.phases[phase])
+                phases[phase] = {'count': len(values), 'total': sum(values), 'max': values[-1] if values else 0}
+                for p in PERCENTILES:
+                    phases[phase]['p{}'.format(p)] = percentile(values, p)
+
+            durations = sorted(f[2] for f in self.files)
+            files = {'count': len(self.files), 'bytes': sum(f[1] for f in self.files), 'total': sum(durations)}
+            for p in PERCENTILES:
+                files['p{}'.format(p)] = percentile(durations, p)
+
+            slowest = sorted(self.files, key=lambda f: f[2], reverse=True)[:top]
+            files['slowest'] = [{'path': path, 'bytes': size, 'total': seconds, 'phases': file_phases} for path, size, seconds, file_phases in slowest]
+
+        return {'phases': phases, 'files': files}
+
+    def log_summary(self, top=10):
+        """Log the summary."""
+        log = logging.getLogger('coastSHARK')
+        s = self.summary(top)
+
+        log.info('[TIMING] {:<15} {:>8} {:>10} {:>10} {:>10} {:>10}'.format('phase', 'count', 'total s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for phase in PHASES:
+            t = s['phases'][phase]
+            log.info('[TIMING] {:<15} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(phase, t['count'], t['total'], t['p50'] * 1000, t['p95'] * 1000, t['p99'] * 1000))
+
+        f = s['files']
+        log.info('[TIMING] {} files with {} bytes extracted in {:.3f}s, per file p50 {:.3f}ms, p95 {:.3f}ms, p99 {:.3f}ms'.format(f['count'], f['bytes'], f['total'], f['p50'] * 1000, f['p95'] * 1000, f['p99'] * 1000))
+        for slow in f['slowest']:
+            phases = ', '.join('{} {:.3f}s'.format(k, v) for k, v in sorted(slow['phases'].items(), key=lambda x: x[1], reverse=True))
+            log.info('[TIMING] slow file {} ({} bytes) {:.3f}s: {}'.format(slow['path'], slow['bytes'], slow['total'], phases))
+
+    def write_report(self, filename, top=10):
+        """Write the summary and the durations of every file as JSON.
+
+        :param str filename: Name of the report file.
+        :param int top: Number of slowest files in the summary.
+        """
+        report = self.summary(top)
+        with self._lock:
+            report['files']['all'] = [{'path': path, 'bytes': size, 'total': seconds, 'phases': phases} for path, size, seconds, phases in self.files]
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+# the timings of this process
+timings = Timings()
@@ -1,30 +1,169 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+"""Output files for the standalone execution.
+
+All formats use the node types in the order of NODE_TYPES and write through a large buffer, the formats ending in .gz are gzip compressed.
+Method metrics are written to a second file next to the output file, e.g., ast.methods.csv for ast.csv.
+"""
+
+import io
+import os
+import abc
 import csv
-from .extract_ast import PYTHON_NODE_TYPES, JAVA_NODE_TYPES
+import gzip
+import json
+
+from .extract_ast import NODE_TYPES
+
+FORMATS = ['csv', 'csv.gz', 'jsonl', 'jsonl.gz', 'sparse']
+
+METHOD_FIELDS = ['package_name', 'class_name', 'method_name', 'return_type', 'parameter_types', 'cognitive_complexity_sonar', 'cyclomatic_complexity', 'is_interface_method']
+
+
+def default_filename(output_format):
+    """Return the default output file name for the format, e.g., ast.csv for csv."""
+    if output_format == 'sparse':
+        return 'ast_sparse.csv.gz'
+    return 'ast.{}'.format(output_format)
+
+
+def sidecar_filename(filename, name):
+    """Return the name of a file which belongs to the output file, e.g., ast.methods.csv for ast.csv and methods.
+
+    :param str filename: The name of the output file.
+    :param str name: The name which is inserted before the extension.
+    """
+    root, ext = os.path.splitext(filename)
+    if ext == '.gz':
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return '{}.{}{}'.format(root, name, ext)
 
 
-class CsvFile(object):
+def open_output_file(filename, output_format):
+    """Return the output file for the format.
 
-    def __init__(self, filename='ast.csv', delimiter=',', quotechar='"'):
+    :param str filename: The name of the output file, None uses the default file name for the format.
+    :param str output_format: One of FORMATS.
+    """
+    if filename is None:
+        filename = default_filename(output_format)
+
+    if output_format in ['csv', 'csv.gz']:
+        return CsvFile(filename, compress=output_format.endswith('.gz'))
+    if output_format in ['jsonl', 'jsonl.gz']:
+        return JsonLinesFile(filename, compress=output_format.endswith('.gz'))
+    if output_format == 'sparse':
+        return SparseFile(filename)
+    raise ValueError('unknown output format: {}'.format(output_format))
+
+
+class OutputFile(abc.ABC):
+    """Base class of the output formats, takes care of buffering, compression and the file for the method metrics."""
+
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, filename, compress=False):
+        """
+        :param str filename: The name of the output file.
+        :param bool compress: gzip the output.
+        """
         self._filename = filename
-        self._fieldnames = list(set(PYTHON_NODE_TYPES + JAVA_NODE_TYPES))  # fieldnames are all known node types
+        self._compress = compress
+        self._f = self._open(filename)
+        self._methods = None
+
+    def _open(self, filename):
+        if self._compress:
+            f = gzip.open(filename, 'wb', compresslevel=6)
+        else:
+            f = open(filename, 'wb', buffering=0)
+        return io.TextIOWrapper(io.BufferedWriter(f, self.BUFFER_SIZE), encoding='utf-8', newline='')
+
+    @abc.abstractmethod
+    def write_line(self, path, imports, node_count, type_counts):
+        """Write the data of one file.
+
+        :param str path: The path of the file.
+        :param list imports: The imports of the file.
+        :param int node_count: The number of AST nodes.
+        :param array type_counts: The count vector in the order of NODE_TYPES.
+        """
+
+    def write_method_metrics(self, path, method_data):
+        """Write the method metrics of one file as csv, the file is opened on the first call.
 
-        self._f = open(self._filename, 'w')
-        self._csv = csv.DictWriter(self._f, delimiter=delimiter, quotechar=quotechar, fieldnames=['path', 'imports', 'node_count'] + self._fieldnames)
-        self._csv.writeheader()
+        :param str path: The path of the file.
+        :param list method_data: The extracted method metrics.
+        """
+        if self._methods is None:
+            self._methods_file = self._open(sidecar_filename(self._filename, 'methods'))
+            self._methods = csv.writer(self._methods_file)
+            self._methods.writerow(['path'] + METHOD_FIELDS)
+
+        for m in method_data:
+            self._methods.writerow([path] + [' '.join(m[f]) if f == 'parameter_types' else m[f] for f in METHOD_FIELDS])
+
+    def close(self):
+        """Flush the buffers and close the files."""
+        self._f.close()
+        if self._methods is not None:
+            self._methods_file.close()
+            self._methods = None
+
+
+class CsvFile(OutputFile):
+    """One row per file with a column for every node type."""
+
+    def __init__(self, filename='ast.csv', delimiter=',', quotechar='"', compress=False):
+        super().__init__(filename, compress)
+        self._fieldnames = NODE_TYPES  # fieldnames are all known node types in the order of the count vectors
+
+        self._csv = csv.writer(self._f, delimiter=delimiter, quotechar=quotechar)
+        self._csv.writerow(['path', 'imports', 'node_count'] + self._fieldnames)
+
+    def write_line(self, path, imports, node_count, type_counts):
+        self._csv.writerow([path, ' '.join(imports), node_count] + type_counts.tolist())
+
+
+class JsonLinesFile(OutputFile):
+    """One JSON object per file, type_counts only contains the node types which occur in the file."""
 
     def write_line(self, path, imports, node_count, type_counts):
-        row = {}
-        for f in self._fieldnames:
-            if f in type_counts.keys():
-                row[f] = type_counts[f]
-            else:
-                row[f] = 0
-
-        row['path'] = path
-        row['imports'] = ' '.join(imports)
-        row['node_count'] = node_count
-
-        self._csv.writerow(row)
+        counts = {nt: c for nt, c in zip(NODE_TYPES, type_counts) if c}
+        self._f.write(json.dumps({'path': path, 'imports': imports, 'node_count': node_count, 'type_counts': counts}))
+        self._f.write('\n')
+
+
+class SparseFile(OutputFile):
+    """Gzip compressed (file_idx, type_idx, count) triplets for all counts which are not 0.
+
+    type_idx is the index in NODE_TYPES, the node types are also written to the .types file next to the output file.
+    The path, imports and node count for each file_idx are written to the .files file next to the output file.
+    """
+
+    def __init__(self, filename='ast_sparse.csv.gz'):
+        super().__init__(filename, compress=True)
+        self._file_idx = 0
+
+        self._csv = csv.writer(self._f)
+        self._csv.writerow(['file_idx', 'type_idx', 'count'])
+
+        self._files_file = self._open(sidecar_filename(filename, 'files'))
+        self._files = csv.writer(self._files_file)
+        self._files.writerow(['file_idx', 'path', 'imports', 'node_count'])
+
+        with self._open(sidecar_filename(filename, 'types')) as f:
+            w = csv.writer(f)
+            w.writerow(['type_idx', 'node_type'])
+            w.writerows(enumerate(NODE_TYPES))
+
+    def write_line(self, path, imports, node_count, type_counts):
+        self._files.writerow([self._file_idx, path, ' '.join(imports), node_count])
+        self._csv.writerows([(self._file_idx, i, c) for i, c in enumerate(type_counts) if c])
+        self._file_idx += 1
+
+    def close(self):
+        super().close()
+        self._files_file.close()
@@ -1,64 +1,324 @@
 #!/usr/bin/env python
 
+"""Writes the extracted data to the MongoDB.
+
+mongoengine, pymongo and pycoshark are imported when they are used for the first time, importing this module is cheap.
+"""
+
+import queue
 import logging
+import timeit
+import threading
+from collections import OrderedDict
+
+from .extract_ast import type_counts_dict, language_node_types
+from .timing import timings
+from . import error
+
+
+def code_entity_state_identifier(long_name, commit_id, file_id):
+    """Return the shard key of the CodeEntityState, see pycoshark.utils.get_code_entity_state_identifier."""
+    from pycoshark.utils import get_code_entity_state_identifier
+    return get_code_entity_state_identifier(long_name, commit_id, file_id)
+
+
+def match_method(sc, method, long_names):
+    """Return the Sourcemeter long_name out of long_names which matches our extracted method, None if there is no match.
+
+    :param SourcemeterConversion sc: The conversion helper.
+    :param dict method: The extracted method metrics.
+    :param list long_names: The long_names of the methods with the same package, class and method name.
+    """
+    # we have only one match, this is simple as we just write the data
+    if len(long_names) == 1:
+        return long_names[0]
+
+    # we have more than one we need to match method signatures
+    match_long_name = sc.get_sm_long_name(method)
+    for long_name in long_names:
+
+        # we just remove dots, $ and / from params in this so that we have a chance to match against our match_long_name
+        match_long_name2 = sc.get_sm_long_name2(long_name)
+
+        # new way:, first one is with long = J second with long = L
+        # does not work with_ org.apache.zookeeper.server.quorum.Zab1_0Test$5.proposeNewSession(LQuorumPacket;LL)V
+        # this gets merged to org.apache.zookeeper.server.quorum.Zab1_0Test$5.proposeNewSession(LQuorumPacket;LL;)V
+        # therefore we include the original long name
+        if match_long_name[0] == match_long_name2 or match_long_name[1] == match_long_name2 or long_name in match_long_name:
+            return long_name
+
+    log = logging.getLogger('coastSHARK')
+    path = '{}.{}.{}('.format(method['package_name'], method['class_name'], method['method_name'])
+    log.error('[NO MATCH] have: path: {}, params: {}, return_type: {}, merged long_name: {}'.format(path, method['parameter_types'], method['return_type'], match_long_name))
+    for long_name in long_names:
+        param, ret = sc.get_sm_params(long_name)
+        log.error('[NO MATCH] searched: long_name: {}, params: {}, return_type: {}, merged long_name: {}'.format(long_name, param, ret, sc.get_sm_long_name2(long_name)))
+    return None
+
+
+class BulkWriter(object):
+    """Buffers CodeEntityState upserts and writes them with unordered bulk_write operations.
+
+    Updates for the same s_key are merged into one operation, e.g., imports and node type counts of a file.
+    The buffer is written every batch_size operations or after interval seconds, whatever comes first.
+    """
+
+    def __init__(self, collection, batch_size=1000, interval=10.0):
+        self._collection = collection
+        self._batch_size = batch_size
+        self._interval = interval
+        self._ops = OrderedDict()
+        self._last_flush = timeit.default_timer()
+        self._log = logging.getLogger('coastSHARK')
+
+        self.written = 0
+        self.errors = 0
+        self._finished_errors = 0
+
+    def upsert(self, s_key, values):
+        """Set values (with dotted field names) on the CodeEntityState identified by s_key.
+
+        :param str s_key: The shard key of the CodeEntityState.
+        :param dict values: The fields to set.
+        """
+        if s_key in self._ops:
+            self._ops[s_key].update(values)
+        else:
+            self._ops[s_key] = dict(values)
+
+        if len(self._ops) >= self._batch_size or timeit.default_timer() - self._last_flush >= self._interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered operations.
+
+        The bulk_write is unordered so that one failing document does not stop the rest of the batch, failures are logged and counted.
+        """
+        self._last_flush = timeit.default_timer()
+        if not self._ops:
+            return
+
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        s_keys = list(self._ops.keys())
+        requests = [UpdateOne({'s_key': s_key}, {'$set': values}, upsert=True) for s_key, values in self._ops.items()]
+        self._ops = OrderedDict()
+
+        try:
+            with timings.measure('mongo_write'):
+                self._collection.bulk_write(requests, ordered=False)
+            self.written += len(requests)
+        except BulkWriteError as bwe:
+            write_errors = bwe.details.get('writeErrors', [])
+            self.written += len(requests) - len(write_errors)
+            self.errors += len(write_errors)
+            self._log.error('[BULK WRITE] {} of {} operations failed in this batch'.format(len(write_errors), len(requests)))
+            for err in write_errors:
+                self._log.error('[BULK WRITE] s_key: {}, code: {}, error: {}'.format(s_keys[err['index']], err.get('code'), err.get('errmsg')))
+
+    def finish(self):
+        """Write the remaining operations, raise if any operation since the last finish failed.
+
+        The writer can still be used afterwards, e.g., for the next job of the server.
+        """
+        self.flush()
+        errors = self.errors - self._finished_errors
+        self._finished_errors = self.errors
+        if errors > 0:
+            raise error.CoastException('{} CodeEntityState writes failed'.format(errors))
+
+    def close(self):
+        """Write the remaining operations, raise if any operation of this run failed."""
+        self.finish()
+
+
+class BackgroundWriter(object):
+    """Runs write calls in a background thread so that the extraction does not wait for the MongoDB.
+
+    The calls are executed in the order in which they are put into a bounded queue, if the database is slower than the extraction
+    put blocks until there is room in the queue again.
+    An exception in the writer thread is raised again in the calling thread by the next put or by close, the remaining calls are dropped.
+    """
+
+    _STOP = object()
+
+    def __init__(self, queue_size=1000):
+        """
+        :param int queue_size: Maximum number of calls waiting for the writer thread.
+        """
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._raised = False
+        self._thread = threading.Thread(target=self._run, name='coastSHARK-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
 
-from mongoengine import connect
-from pycoshark.mongomodels import Project, VCSSystem, File, Commit, CodeEntityState
-from pycoshark.utils import get_code_entity_state_identifier, create_mongodb_uri_string
-from .complexity_java import SourcemeterConversion
+            # after an error we only empty the queue so that put does not block
+            if self._error is not None:
+                continue
+
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None and not self._raised:
+            self._raised = True
+            raise self._error
+
+    def put(self, fn, *args):
+        """Call fn(*args) in the writer thread, blocks while the queue is full."""
+        self._raise_error()
+        self._queue.put((fn, args))
+
+    def close(self):
+        """Wait until all queued calls are done, raise the error of the writer thread if it was not raised before.
+
+        This can be called more than once.
+        """
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._raise_error()
 
 
 class MongoDb(object):
     """This class just wraps the Mongo connection code and the query for fetching the correct CodeEntityState for inserting the AST information."""
 
-    def __init__(self, database, user, password, host, port, authentication, ssl, project_name, vcs_url, revision):
+    def __init__(self, database, user, password, host, port, authentication, ssl, project_name, vcs_url, revision, batch_size=1000, flush_interval=10.0):
         self.project_name = project_name
         self.vcs_url = vcs_url
         self.revision = revision
         self.database = database
+
+        from pycoshark.utils import create_mongodb_uri_string
         self.uri = create_mongodb_uri_string(user, password, host, port, authentication, ssl)
         self._log = logging.getLogger('coastSHARK')
 
+        self.project = None
+        self.vcs = None
+        self.commit = None
+        self.files = {}
+        self._missing_files = set()
+
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._writer = None
+
     def connect(self):
+        """Connect to the MongoDB and resolve the Project, VCSSystem and Commit of this run once.
+
+        We also fetch the path and id of every File of the VCSSystem in one query so we do not need one query per file.
+        """
+        from mongoengine import connect
+        from pycoshark.mongomodels import Project, VCSSystem, File, CodeEntityState
+
         connect(self.database, host=self.uri)
 
+        with timings.measure('mongo_lookup'):
+            self.project = Project.objects.get(name=self.project_name)
+            self.vcs = VCSSystem.objects.get(url=self.vcs_url, project_id=self.project.id)
+
+        self.set_revision(self.revision)
+
+        with timings.measure('mongo_lookup'):
+            for f in File.objects(vcs_system_id=self.vcs.id).only('path').as_pymongo():
+                self.files[f['path']] = f['_id']
+        self._log.info('found {} files for vcs system {}'.format(len(self.files), self.vcs_url))
+
+        self._writer = BulkWriter(CodeEntityState._get_collection(), self._batch_size, self._flush_interval)
+
+    def flush(self):
+        """Write all buffered CodeEntityState updates, raise if any of them failed since the last flush.
+
+        The connection and the file index are kept, e.g., for the next job of the server.
+        """
+        written = self._writer.written
+        try:
+            self._writer.finish()
+        finally:
+            self._log.info('wrote {} code entity states'.format(self._writer.written - written))
+
+    def close(self):
+        """Write all buffered CodeEntityState updates."""
+        self.flush()
+
+    def set_revision(self, revision):
+        """Switch to another revision of the same VCSSystem, all following writes belong to this Commit.
+
+        :param str revision: The revision hash.
+        """
+        from pycoshark.mongomodels import Commit
+
+        self.revision = revision
+        with timings.measure('mongo_lookup'):
+            self.commit = Commit.objects.get(revision_hash=self.revision, vcs_system_id=self.vcs.id)
+        self._missing_files.clear()
+
+    def _file_id(self, filepath):
+        """Return the id of the File document for this path, or None (with a warning) if there is none.
+
+        Paths which are not in the index loaded by connect are looked up once per revision,
+        the File may have been added by vcsSHARK after the index was loaded, e.g., by a long running server.
+        """
+        file_id = self.files.get(filepath, None)
+        if file_id is None and filepath not in self._missing_files:
+            from pycoshark.mongomodels import File
+
+            with timings.measure('mongo_lookup'):
+                f = File.objects(vcs_system_id=self.vcs.id, path=filepath).only('path').as_pymongo().first()
+            if f is not None:
+                file_id = self.files[filepath] = f['_id']
+            else:
+                self._missing_files.add(filepath)
+                self._log.warning('[FILE NOT FOUND] path: {}, vcs_system_id: {}, skipping file'.format(filepath, self.vcs.id))
+        return file_id
+
     def write_imports(self, filepath, imports):
         """Write imports to code_entity_states.
 
         :param str filepath: The full path of this file.
         :param list imports: A list of strings containing the imports.
         """
-        project = Project.objects.get(name=self.project_name)
-        vcs = VCSSystem.objects.get(url=self.vcs_url, project_id=project.id)
-        c = Commit.objects.get(revision_hash=self.revision, vcs_system_id=vcs.id)
-        f = File.objects.get(path=filepath, vcs_system_id=vcs.id)
+        c = self.commit
+        file_id = self._file_id(filepath)
+        if file_id is None:
+            return
 
-        s_key = get_code_entity_state_identifier(filepath, c.id, f.id)
+        s_key = code_entity_state_identifier(filepath, c.id, file_id)
 
-        CodeEntityState.objects(s_key=s_key).upsert_one(imports=imports, ce_type='file', long_name=filepath, commit_id=c.id, file_id=f.id)
+        self._writer.upsert(s_key, {'imports': imports, 'ce_type': 'file', 'long_name': filepath, 'commit_id': c.id, 'file_id': file_id})
 
     def write_node_type_counts(self, filepath, node_count, node_type_counts):
         """Write AST bag-of-words and number of AST nodes for this file to code_entity_states.
 
         :param str filepath: The full path of this file.
         :param int node_count: The number of AST nodes.
-        :param dict node_type_counts: The number for each type of AST node.
+        :param array node_type_counts: The number for each type of AST node in the order of NODE_TYPES, only the types of the language of the file are written.
         """
-        project = Project.objects.get(name=self.project_name)
-        vcs = VCSSystem.objects.get(url=self.vcs_url, project_id=project.id)
-        c = Commit.objects.get(revision_hash=self.revision, vcs_system_id=vcs.id)
-        f = File.objects.get(path=filepath, vcs_system_id=vcs.id)
+        c = self.commit
+        file_id = self._file_id(filepath)
+        if file_id is None:
+            return
 
-        tmp = {'set__metrics__{}'.format(k): v for k, v in node_type_counts.items()}
-        tmp['set__metrics__node_count'] = node_count
+        tmp = {'metrics.{}'.format(k): v for k, v in type_counts_dict(node_type_counts, language_node_types(filepath)).items()}
+        tmp['metrics.node_count'] = node_count
         tmp['ce_type'] = 'file'
         tmp['long_name'] = filepath
         tmp['commit_id'] = c.id
-        tmp['file_id'] = f.id
+        tmp['file_id'] = file_id
 
-        s_key = get_code_entity_state_identifier(filepath, c.id, f.id)
+        s_key = code_entity_state_identifier(filepath, c.id, file_id)
 
-        CodeEntityState.objects(s_key=s_key).upsert_one(**tmp)
+        self._writer.upsert(s_key, tmp)
 
     def write_method_metrics(self, filepath, method_data):
         """Write additional method metrics.
@@ -66,57 +326,36 @@ class MongoDb(object):
         :param str filepath: The full path of this file.
         :param dict method_data: The extracted method metrics.
         """
-        project = Project.objects.get(name=self.project_name)
-        vcs = VCSSystem.objects.get(url=self.vcs_url, project_id=project.id)
-        c = Commit.objects.get(revision_hash=self.revision, vcs_system_id=vcs.id)
-        f = File.objects.get(path=filepath, vcs_system_id=vcs.id)
+        c = self.commit
+        file_id = self._file_id(filepath)
+        if file_id is None:
+            return
+
+        from pycoshark.mongomodels import CodeEntityState
+        from .complexity_java import SourcemeterConversion
+
+        # one query for all methods of this file, indexed by the long_name up to the parameters
+        methods = {}
+        with timings.measure('mongo_lookup'):
+            for ces in CodeEntityState.objects(commit_id=c.id, file_id=file_id, ce_type='method').only('long_name').as_pymongo():
+                methods.setdefault(ces['long_name'].split('(')[0] + '(', []).append(ces['long_name'])
 
         sc = SourcemeterConversion()
 
         for m in method_data:
             path = '{}.{}.{}('.format(m['package_name'], m['class_name'], m['method_name'])
-            match_long_name = sc.get_sm_long_name(m)
 
-            if CodeEntityState.objects.filter(long_name__startswith=path, commit_id=c.id, file_id=f.id, ce_type='method').count() == 0:
-                self._log.error('[METHOD NOT FOUND] long_name: {}, commit_id: {}, file_id: {}, probably wrong method path'.format(path, c.id, f.id))
+            if path not in methods.keys():
+                self._log.error('[METHOD NOT FOUND] long_name: {}, commit_id: {}, file_id: {}, probably wrong method path'.format(path, c.id, file_id))
                 continue
 
-            # we have only one match, this is simple as we just write the data
-            if CodeEntityState.objects.filter(long_name__startswith=path, commit_id=c.id, file_id=f.id, ce_type='method').count() == 1:
-                ces = CodeEntityState.objects.filter(long_name__startswith=path, commit_id=c.id, file_id=f.id, ce_type='method')[0]
-                long_name = ces.long_name
-
-                s_key = get_code_entity_state_identifier(long_name, c.id, f.id)
-                tmp = {}
-                tmp['set__metrics__cognitive_complexity_sonar'] = m['cognitive_complexity_sonar']
-                tmp['set__metrics__cyclomatic_complexity_test'] = m['cyclomatic_complexity']
-
-                CodeEntityState.objects(s_key=s_key).upsert_one(**tmp)
+            long_name = match_method(sc, m, methods[path])
+            if long_name is None:
                 continue
 
-            # we have more than one we need to match method signatures
-            for ces in CodeEntityState.objects.filter(long_name__startswith=path, commit_id=c.id, file_id=f.id, ce_type='method'):
+            s_key = code_entity_state_identifier(long_name, c.id, file_id)
+            tmp = {}
+            tmp['metrics.cognitive_complexity_sonar'] = m['cognitive_complexity_sonar']
+            tmp['metrics.cyclomatic_complexity_test'] = m['cyclomatic_complexity']
 
-                # we just remove dots, $ and / from params in this so that we have a chance to match against our match_long_name
-                match_long_name2 = sc.get_sm_long_name2(ces.long_name)
-
-                # new way:, first one is with long = J second with long = L
-                # does not work with_ org.apache.zookeeper.server.quorum.Zab1_0Test$5.proposeNewSession(LQuorumPacket;LL)V
-                # this gets merged to org.apache.zookeeper.server.quorum.Zab1_0Test$5.proposeNewSession(LQuorumPacket;LL;)V
-                # therefore we include the original long name
-                if match_long_name[0] == match_long_name2 or match_long_name[1] == match_long_name2 or ces.long_name in match_long_name:
-
-                    long_name = ces.long_name
-
-                    s_key = get_code_entity_state_identifier(long_name, c.id, f.id)
-                    tmp = {}
-                    tmp['set__metrics__cognitive_complexity_sonar'] = m['cognitive_complexity_sonar']
-                    tmp['set__metrics__cyclomatic_complexity_test'] = m['cyclomatic_complexity']
-
-                    CodeEntityState.objects(s_key=s_key).upsert_one(**tmp)
-                    break
-            else:
-                self._log.error('[NO MATCH] have: path: {}, params: {}, return_type: {}, merged long_name: {}'.format(path, m['parameter_types'], m['return_type'], match_long_name))
-                for c1 in CodeEntityState.objects.filter(long_name__startswith=path, commit_id=c.id, file_id=f.id, ce_type='method'):
-                    param, ret = sc.get_sm_params(c1.long_name)
-                    self._log.error('[NO MATCH] searched: long_name: {}, params: {}, return_type: {}, merged long_name: {}'.format(c1.long_name, param, ret, match_long_name2))
+            self._writer.upsert(s_key, tmp)
@@ -8,7 +8,7 @@ import sys
 # we know where we are, we need this for the import below
 sys.path.insert(0, '../coastSHARK/')
 
-from util.extract_ast import PYTHON_NODE_TYPES, JAVA_NODE_TYPES
+from util.extract_ast import PYTHON_NODE_TYPES, JAVA_NODE_TYPES, NODE_TYPES
 
 
 def main():
@@ -18,24 +18,17 @@ def main():
     both_desc = 'Occurrences of this Java and Python Node Type in the AST of the file.'
     node_count_desc = 'Number of AST Nodes in the file.'
 
-    # each AST node type has a field with its number of occurrences in the file
+    # each AST node type has a field with its number of occurrences in the file, in the same order as the count vectors
     fields = []
-    for nt in PYTHON_NODE_TYPES:
-        logical_type = ['ProductMetric', 'ASTNodeType', 'Python']
-        desc = python_desc
+    for nt in NODE_TYPES:
 
         # node types that occur in both languages, e.g., import exists in JAVA and PYTHON
-        if nt in JAVA_NODE_TYPES:
-            logical_type.append('Java')
-            desc = both_desc
-
-        fields.append({'type': 'IntegerType', 'logical_type': logical_type, 'field_name': nt, 'desc': desc})
-
-    for nt in JAVA_NODE_TYPES:
-        if nt in PYTHON_NODE_TYPES:
-            continue  # we already have double nodes
-
-        fields.append({'type': 'IntegerType', 'logical_type': ['ProductMetric', 'ASTNodeType', 'Java'], 'field_name': nt, 'desc': java_desc})
+        if nt in PYTHON_NODE_TYPES and nt in JAVA_NODE_TYPES:
+            fields.append({'type': 'IntegerType', 'logical_type': ['ProductMetric', 'ASTNodeType', 'Python', 'Java'], 'field_name': nt, 'desc': both_desc})
+        elif nt in PYTHON_NODE_TYPES:
+            fields.append({'type': 'IntegerType', 'logical_type': ['ProductMetric', 'ASTNodeType', 'Python'], 'field_name': nt, 'desc': python_desc})
+        else:
+            fields.append({'type': 'IntegerType', 'logical_type': ['ProductMetric', 'ASTNodeType', 'Java'], 'field_name': nt, 'desc': java_desc})
 
     # we also have tho complete number of nodes
     fields.append({'type': 'IntegerType', 'logical_type': ['ProductMetric', 'ASTNodeType', 'Java', 'Python'], 'field_name': 'node_count', 'desc': node_count_desc})
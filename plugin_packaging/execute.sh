@@ -2,8 +2,6 @@
 
 PLUGIN_PATH=$3
 REPOSITORY_PATH=$2
-NEW_UUID=$(cat /dev/urandom | tr -dc 'a-zA-Z0-9' | fold -w 32 | head -n 1)
-RAMDISK_PATH="/dev/shm/$NEW_UUID"
 
 # https://stackoverflow.com/questions/24597818/exit-with-error-message-in-bash-oneline
 function error_exit {
@@ -11,17 +9,17 @@ function error_exit {
     exit "${2:-1}"  ## Return a code specified by $2 or 1 by default.
 }
 
-# in case of slurm we use the provided jobid and path
-if [ ! -z "$SLURM_JOB_ID" ]; then
-    RAMDISK_PATH="/dev/shm/jobs/$SLURM_JOB_ID"
+# we read the files of the revision directly from the git objects, no copy or checkout needed
+if [ ! -d "$REPOSITORY_PATH/.git" ]; then
+    error_exit ".git folder not found!"
 fi
 
-rsync -q -r $REPOSITORY_PATH/ $RAMDISK_PATH || error_exit "error copy to ramdisk"
-
-cd $RAMDISK_PATH || error_exit "error cd to ramdisk"
-git checkout -f --quiet $1 || error_exit "error checkout"
+# a running smartshark_serve.py on $COASTSHARK_SOCKET takes the job, it already has the database settings
+if [ ! -z "$COASTSHARK_SOCKET" ] && [ -S "$COASTSHARK_SOCKET" ]; then
+    exec python3.5 $PLUGIN_PATH/smartshark_client.py -s $COASTSHARK_SOCKET --repository_url ${4} --project_name ${5} -r ${1} -i $REPOSITORY_PATH/ --git_revision
+fi
 
-COMMAND="python3.5 $PLUGIN_PATH/smartshark_plugin.py --repository_url ${4} --project_name ${5} -DB ${8} -H ${9} -p ${10} -r ${1} -i $RAMDISK_PATH/"
+COMMAND="python3.5 $PLUGIN_PATH/smartshark_plugin.py --repository_url ${4} --project_name ${5} -DB ${8} -H ${9} -p ${10} -r ${1} -i $REPOSITORY_PATH/ --git_revision"
 
     
 if [ ! -z ${6+x} ] && [ ${6} != "None" ]; then
@@ -49,19 +47,3 @@ if [ ! -z ${14+x} ] && [ ${14} != "None" ]; then
 fi
 
 eval $COMMAND
-
-# if folder does not exist log it to stderr only and exit later with 1
-MISSING=""
-if [ ! -d "$RAMDISK_PATH/.git" ]; then
-    (>&2 echo ".git folder not found!")
-    MISSING="yes"
-fi
-
-# if we are on slurm this is automated (and we have no permission to remove the folder anyway) 
-if [ -z "$SLURM_JOB_ID" ]; then
-    rm -rf $RAMDISK_PATH
-fi
-
-if [ ! -z "$MISSING" ]; then
-    exit 1
-fi